@@ -1,16 +1,18 @@
 import os
+import uuid
 import streamlit as st
-import google.generativeai as genai
 from dotenv import load_dotenv
-from gtts import gTTS
-import base64
-from io import BytesIO
+
+load_dotenv()  # Before the assistant imports: their settings (MODEL_BACKEND, LIBRARY_DB_PATH, HTTP_*, ...) are read at import time.
 
 # --- Core Module Imports ---
 try:
-    from assistant.database import check_member_credentials, signup_member
-    from assistant.tools import add_book, add_member, reserve_book, search_books
-    from assistant.gemini_tools import all_gemini_tools, available_tools
+    from assistant.chat import response_cache, run_turn
+    from assistant.history import compact_chat
+    from assistant.connection import pool_stats
+    from assistant.importer import import_catalog
+    from assistant.model import MODEL_BACKEND, load_model
+    from assistant import database, http_client, service, speech, thumbnails, tools, tracing, warmup
 except ImportError as e:
     st.error(f"🚨 Critical Import Error: Failed to import a core module. Ensure project structure is correct. Details: {e}")
     st.stop()
@@ -45,50 +47,70 @@ def load_css():
     </style>
     """, unsafe_allow_html=True)
 
-# --- 2. Text-to-Speech Function (Corrected) ---
-def text_to_speech_autoplay(text: str):
-    try:
-        tts = gTTS(text=text, lang='en', slow=False)
-        mp3_fp = BytesIO()
-        tts.write_to_fp(mp3_fp)
-        mp3_fp.seek(0)
-        audio_bytes = mp3_fp.read()
-        audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
-        audio_html = f'<audio autoplay="true"><source src="data:audio/mp3;base64,{audio_base64}" type="audio/mpeg"></audio>'
-        return audio_html
+# --- 2. Tool Service Calls & Text-to-Speech (cached by content; see assistant/speech.py) ---
+TTS_LANG = "en"
+TTS_PRESYNTHESIZE = os.environ.get("TTS_PRESYNTHESIZE", "").lower() in ("1", "true", "yes")
+
+def call_service(name: str, /, *args, **kwargs):
+    """Runs a call on the background tool service; when it is overloaded, shows that instead of crashing the page."""
+    try: return service.call(name, *args, **kwargs)
+    except service.ServiceBusy as e: st.error(f"⏳ {e}"); st.stop()
+
+def text_to_speech(text: str) -> bytes:
+    try: return service.call("synthesize", text, TTS_LANG)
     except Exception as e:
-        print(f"Error in TTS: {e}"); return ""
+        print(f"Error in TTS: {e}"); return b""
 
 # --- 3. API Configuration & AI Model Loading ---
-load_dotenv(); api_key = os.environ.get("GOOGLE_API_KEY")
-if not api_key: st.error("🚨 GOOGLE_API_KEY not found in .env file."); st.stop()
-try: genai.configure(api_key=api_key)
-except Exception as e: st.error(f"🚨 API Config Error: {e}"); st.stop()
-
-@st.cache_resource
-def load_model():
-    system_instruction = (
-        "You are an AI Book's Assistant. Your creator is a brilliant developer named Taha. When asked 'who made you' or any similar question, you must proudly say: 'I was created by Taha'. "
-        "Your most important rule is to **detect the user's language and respond ONLY in that same language.** Your responses should be concise and clear for the text-to-speech engine. "
-        "Your protocol is strict: "
-        "1. **Persona**: Be friendly, knowledgeable, and enthusiastic. "
-        "2. **Clarify First**: If a user's request is vague, ask clarifying questions in their language. "
-        "3. **Catalog Research**: For SPECIFIC book/author queries, you MUST use the `search_books` tool. "
-        "4. **Creative Recommendation**: For MOOD or GENRE requests, DO NOT use the search tool. Use your own knowledge. "
-        "5. **Propose Actions**: After a successful search, you MUST proactively ask the user, in their language, if they want to reserve a book. "
-        "6. **Execute Actions**: If they confirm, use the `reserve_book` tool."
-    )
-    return genai.GenerativeModel('gemini-1.5-flash-latest', tools=all_gemini_tools, system_instruction=system_instruction)
-
-# --- 4. Session State & Theme Initialization ---
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "1").lower() in ("1", "true", "yes")
+WARMUP_ON_START = os.environ.get("WARMUP_ON_START", "1").lower() in ("1", "true", "yes")
+
+api_key = os.environ.get("GOOGLE_API_KEY")
+if not api_key and MODEL_BACKEND in ("gemini", "record"): st.error("🚨 GOOGLE_API_KEY not found in .env file."); st.stop()
+if WARMUP_ON_START: warmup.warm_up_in_background() # Once per process: model, DB, index and tool service get ready while the login page shows
+
+# --- 4. Chat History Rendering ---
+HISTORY_PAGE_SIZE = 20  # Messages rendered per page; older ones stay behind a "load earlier" button.
+
+def book_cards(books: list) -> list:
+    """Precomputes what a search-result message displays, once, when the message is created."""
+    return [{"title": book["title"], "cover": thumbnails.local_path(book["cover_path"]) if book.get("cover_path") else book.get("cover_url"),
+             "reservation_key": uuid.uuid4().hex,  # Sent with every click of this card's Reserve button.
+             "markdown": f"**{book['title']}** by {book['author']}<br>*{book['genre']} | {book['copies']} copies left*"} for book in books]
+
+def add_message(role: str, content):
+    """Appends a message with a stable ID, so its widget keys never change as history grows."""
+    msg = {"id": st.session_state.next_message_id, "role": role, "content": content}
+    if isinstance(content, list): msg["cards"] = book_cards(content)
+    st.session_state.next_message_id += 1; st.session_state.messages.append(msg)
+
+@st.experimental_fragment # Clicking Reserve reruns this message only, not the whole page
+def render_book_cards(msg: dict):
+    for n, card in enumerate(msg["cards"]):
+        col1, col2 = st.columns([1, 3])
+        if card["cover"]: col1.image(card["cover"])
+        with col2: st.markdown(card["markdown"], unsafe_allow_html=True)
+        if st.button(f"Reserve '{card['title']}'", key=f"reserve_{msg['id']}_{n}"):
+            st.success(call_service("reserve_book", st.session_state.member_info['id'], card['title'], idempotency_key=card["reservation_key"]))
+
+@st.experimental_fragment # Playing audio reruns this message only, not the whole page
+def render_assistant_message(msg: dict):
+    col1, col2 = st.columns([0.9, 0.1])
+    with col1: st.markdown(msg["content"])
+    with col2: speak = st.button("🔊", key=f"speak_{msg['id']}", help="Read this message aloud")
+    if speak and (audio := text_to_speech(msg["content"])): st.audio(audio, format="audio/mp3", autoplay=True)
+
+# --- 5. Session State & Theme Initialization ---
 st.session_state.setdefault("logged_in", False)
 st.session_state.setdefault("member_info", None)
 st.session_state.setdefault("chat_session", None)
 st.session_state.setdefault("messages", [])
-st.session_state.setdefault("audio_to_play", None)
+st.session_state.setdefault("next_message_id", 0)
+st.session_state.setdefault("history_window", HISTORY_PAGE_SIZE)
+st.session_state.setdefault("turn_stats", [])
 load_css()
 
-# --- 5. Stylish Sidebar ---
+# --- 6. Stylish Sidebar ---
 with st.sidebar:
     st.markdown('<div class="logo-container">', unsafe_allow_html=True)
     st.image(LOGO_PATH,width=300)
@@ -98,7 +120,7 @@ with st.sidebar:
 
     if st.session_state.logged_in and st.session_state.member_info:
         st.success(f"Logged in as **{st.session_state.member_info['name']}**")
-        if st.button("Clear Conversation", use_container_width=True): st.session_state.messages = []; st.rerun()
+        if st.button("Clear Conversation", use_container_width=True): st.session_state.messages = []; st.session_state.history_window = HISTORY_PAGE_SIZE; st.rerun()
         if st.button("Logout", use_container_width=True): st.session_state.clear(); st.rerun()
         
         if st.session_state.member_info['id'] == ADMIN_ID: # Admin Panel
@@ -107,12 +129,34 @@ with st.sidebar:
                  with st.form("add_book_form", clear_on_submit=True):
                     title, author = st.text_input("Title"), st.text_input("Author")
                     genre, copies = st.text_input("Genre"), st.number_input("Copies", min_value=1)
-                    if st.form_submit_button("Add Book", type="primary"): st.success(add_book(title, author, genre, copies))
+                    if st.form_submit_button("Add Book", type="primary"): st.success(call_service("add_book", title, author, genre, copies))
+            with st.expander("📥 Bulk Import"):
+                catalog_file = st.file_uploader("CSV or JSONL catalog dump", type=["csv", "jsonl"], help="Columns: title, author, genre, copies. Existing titles are updated.")
+                if catalog_file and st.button("Import Catalog", type="primary", use_container_width=True):
+                    with st.spinner("Importing..."): stats = import_catalog(catalog_file)
+                    st.success(f"Imported {stats['rows_written']:,} books ({stats['rows_skipped']:,} skipped) at {stats['rows_per_sec']:,} rows/sec.")
+            with st.expander("⏱️ Latency"):
+                tracing.set_enabled(st.toggle("Record traces", value=tracing.enabled(), help="Writes per-turn spans to a rotating JSONL file."))
+                recent = tracing.recent_turns()
+                if recent:
+                    st.caption(f"Per-stage latency over the last {len(recent)} turns"); st.dataframe(tracing.stage_percentiles(recent), hide_index=True, use_container_width=True)
+                    st.caption("Recent turns"); st.dataframe(recent, hide_index=True, use_container_width=True)
+                else: st.caption("No traced turns yet.")
+            with st.expander("📊 System Stats"):
+                st.caption("Database connections"); st.json(pool_stats())
+                st.caption("Cover cache"); st.json(tools.cover_cache.stats())
+                st.caption("Member cache"); st.json(database.member_cache.stats())
+                st.caption("Outbound HTTP"); st.json(http_client.stats())
+                st.caption("Speech cache"); st.json(speech.stats())
+                st.caption("Response cache"); st.json(response_cache.stats())
+                st.caption("Tool service"); st.json(service.stats())
+                if st.session_state.turn_stats:
+                    st.caption("Recent turns (this session)"); st.dataframe(st.session_state.turn_stats[::-1], use_container_width=True)
     else:
         st.info("Please log in or sign up to begin.")
     st.markdown("<div class='sidebar-footer'>Made with ❤️ by Taha</div>", unsafe_allow_html=True)
 
-# --- 6. Main Application Logic ---
+# --- 7. Main Application Logic ---
 
 if not st.session_state.logged_in: # LOGIN / SIGNUP SCREEN
     st.image(LOGIN_IMAGE_PATH); st.title("Welcome to the Digital Library!")
@@ -123,10 +167,11 @@ if not st.session_state.logged_in: # LOGIN / SIGNUP SCREEN
             name = st.text_input("Name", placeholder="Type Your Full Name"); member_id = st.text_input("Member ID", placeholder="Type Your Member ID")
             if st.form_submit_button("Login", type="primary", use_container_width=True):
                 if member_id.isdigit():
-                    member_info = check_member_credentials(int(member_id), name)
+                    member_info = call_service("check_member_credentials", int(member_id), name)
                     if member_info:
-                        st.session_state.logged_in = True; st.session_state.member_info = member_info
-                        st.session_state.chat_session = load_model().start_chat(); st.rerun()
+                        try: st.session_state.chat_session = load_model().start_chat()
+                        except Exception as e: st.error(f"🚨 API Config Error: {e}"); st.stop()
+                        st.session_state.logged_in = True; st.session_state.member_info = member_info; st.rerun()
                     else: st.error("Login failed. Name or ID is incorrect.")
                 else: st.error("Member ID must be a valid number.")
     with signup_tab:
@@ -134,7 +179,7 @@ if not st.session_state.logged_in: # LOGIN / SIGNUP SCREEN
             name, email = st.text_input("Full Name"), st.text_input("Email Address")
             if st.form_submit_button("Sign Up", type="primary", use_container_width=True):
                 if name and email:
-                    response = signup_member(name, email)
+                    response = call_service("signup_member", name, email)
                     if "Success" in response: st.success(response)
                     else: st.error(response)
                 else: st.warning("Please fill in both name and email.")
@@ -142,66 +187,46 @@ if not st.session_state.logged_in: # LOGIN / SIGNUP SCREEN
 else: # CHAT INTERFACE
     st.subheader(f"Chat with your Assistant", divider="rainbow")
     
-    # --- Plays audio triggered by a button click ---
-    if st.session_state.audio_to_play:
-        st.markdown(st.session_state.audio_to_play, unsafe_allow_html=True)
-        st.session_state.audio_to_play = None
+    messages = st.session_state.messages # Display only the most recent window of history
+    hidden = max(0, len(messages) - st.session_state.history_window)
+    if hidden and st.button(f"⬆️ Load {min(hidden, HISTORY_PAGE_SIZE)} earlier messages", key="load_earlier", use_container_width=True):
+        st.session_state.history_window += HISTORY_PAGE_SIZE; st.rerun()
 
-    for i, msg in enumerate(st.session_state.messages): # Display history
+    for msg in messages[hidden:]:
         with st.chat_message(msg["role"]):
-            if isinstance(msg["content"], list):
-                for book in msg["content"]:
-                    col1, col2 = st.columns([1, 3])
-                    if book.get("cover_url"): col1.image(book["cover_url"])
-                    with col2: st.markdown(f"**{book['title']}** by {book['author']}<br>*{book['genre']} | {book['copies']} copies left*", unsafe_allow_html=True)
-                    if st.button(f"Reserve '{book['title']}'", key=f"reserve_{book['title']}"):
-                        st.success(reserve_book(st.session_state.member_info['id'], book['title']))
-            
-            elif msg["role"] == "assistant": # Assistant messages with speak button
-                col1, col2 = st.columns([0.9, 0.1])
-                with col1: st.markdown(msg["content"])
-                with col2:
-                    if st.button("🔊", key=f"speak_{i}", help="Read this message aloud"):
-                        st.session_state.audio_to_play = text_to_speech_autoplay(msg["content"])
-                        st.rerun()
-            else: # User messages
-                st.markdown(msg["content"])
+            if "cards" in msg: render_book_cards(msg)
+            elif msg["role"] == "assistant": render_assistant_message(msg) # Assistant messages with speak button
+            else: st.markdown(msg["content"]) # User messages
 
     if prompt := st.chat_input("Ask about books, Your moods, Or Your Account..."):
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        add_message("user", prompt)
         st.rerun()
 
     if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
         with st.chat_message("assistant"):
             chat = st.session_state.chat_session
             try:
-                with st.spinner("Thinking..."):
-                    response = chat.send_message(st.session_state.messages[-1]['content'])
-                    
-                    while response.candidates[0].content.parts[0].function_call.name:
-                        fc = response.candidates[0].content.parts[0].function_call; tool_func = available_tools.get(fc.name)
-                        if tool_func:
-                            tool_args = {key: value for key, value in fc.args.items()}
-                            if fc.name in ["reserve_book"]: tool_args['member_id'] = st.session_state.member_info['id']
-                            output = tool_func(**tool_args)
-                            response = chat.send_message(genai.types.Part.from_function_response(name=fc.name, response={"content": output}))
-                        else: st.error(f"Error: Model tried to call unknown tool: {fc.name}"); break
-                
-                final_content = ""
-                last_part = response.candidates[0].content.parts[0]
-                if hasattr(last_part, 'function_response') and last_part.function_response:
-                    response_data = last_part.function_response.response
-                    if response_data: final_content = response_data.get('content')
-                
-                if not final_content and hasattr(last_part, 'text'):
-                    final_content = last_part.text
+                prompt, member_id, turn_stats = st.session_state.messages[-1]['content'], st.session_state.member_info['id'], {}
+                if STREAM_RESPONSES: # Render chunks into the bubble as they arrive
+                    placeholder, streamed = st.empty(), []
+                    def show_chunk(text: str):
+                        streamed.append(text); placeholder.markdown("".join(streamed) + "▌")
+                    final_content = run_turn(chat, prompt, member_id, on_text=show_chunk, stats=turn_stats, lang=TTS_LANG)
+                else:
+                    with st.spinner("Thinking..."):
+                        final_content = run_turn(chat, prompt, member_id, stats=turn_stats, lang=TTS_LANG)
                 
-                st.session_state.messages.append({"role": "assistant", "content": final_content})
+                st.session_state.chat_session, compaction = compact_chat(chat) # Keep the resent history within budget
+                turn_stats.update(history_tokens=compaction["tokens_after"], tokens_saved=compaction["tokens_saved"])
+                st.session_state.turn_stats = (st.session_state.turn_stats + [turn_stats])[-50:]
+                if books := turn_stats.pop("books"): add_message("assistant", books)
+                add_message("assistant", final_content)
+                if TTS_PRESYNTHESIZE and final_content: speech.presynthesize(final_content, TTS_LANG)
                 st.rerun()
 
             except Exception as e:
                 st.error(f"An unexpected error occurred: {e}")
 
     if len(st.session_state.messages) == 0:
-        st.session_state.messages.append({"role": "assistant", "content": f"Hello {st.session_state.member_info['name']}! How can I help you today?"})
+        add_message("assistant", f"Hello {st.session_state.member_info['name']}! How can I help you today?")
         st.rerun()
\ No newline at end of file
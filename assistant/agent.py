@@ -1,11 +1,15 @@
 # full path: /intelligence-library-assistance/assistant/agent.py
 
+import functools
 import os
-from openai import OpenAI
 from typing import List, Callable
 from inspect import signature
 
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """Creates the OpenAI client on first use instead of at import time."""
+    from openai import OpenAI
+    return OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
 ASSISTANT_NAME = "Intelligence Library Assistant"
 ASSISTANT_INSTRUCTIONS = """
@@ -49,7 +53,7 @@ def create_assistant(tools_list: List[Callable]):
             }
         })
 
-    assistant = client.beta.assistants.create(
+    assistant = get_client().beta.assistants.create(
         name=ASSISTANT_NAME, instructions=ASSISTANT_INSTRUCTIONS,
         model="gpt-4o", # Using the latest, fastest, and most capable model
         tools=tools_api
@@ -0,0 +1,226 @@
+# assistant/backends.py
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from .history import to_dicts
+from .response_cache import normalize_prompt
+
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "gemini")  # gemini | record | replay | scripted
+MODEL_FIXTURES = os.environ.get("MODEL_FIXTURES") or os.path.join(os.path.dirname(__file__), '..', 'fixtures', 'model_exchanges.jsonl')
+MODEL_LATENCY_MS = float(os.environ.get("MODEL_LATENCY_MS", 800))  # Stand-in time to first chunk.
+MODEL_LATENCY_JITTER_MS = float(os.environ.get("MODEL_LATENCY_JITTER_MS", 200))
+MODEL_CHUNK_MS = float(os.environ.get("MODEL_CHUNK_MS", 30))  # Delay between streamed chunks.
+MODEL_STREAM_CHUNKS = int(os.environ.get("MODEL_STREAM_CHUNKS", 4))
+
+# --- Minimal stand-ins for the SDK's response types (only what chat.py and history.py read) ---
+
+class FunctionCall:
+    def __init__(self, name: str = "", args: dict = None):
+        self.name, self.args = name, args or {}
+
+class FunctionResponse:
+    name, response = "", {}
+
+class Part:
+    def __init__(self, text: str = "", function_call: FunctionCall = None):
+        self.text, self.function_call, self.function_response = text, function_call or FunctionCall(), FunctionResponse()
+
+    @classmethod
+    def from_dict(cls, part: dict) -> "Part":
+        if "function_call" in part: return cls(function_call=FunctionCall(part["function_call"]["name"], dict(part["function_call"].get("args") or {})))
+        return cls(text=part.get("text", ""))
+
+class Content:
+    def __init__(self, parts: list, role: str = "model"):
+        self.parts, self.role = parts, role
+
+class Candidate:
+    def __init__(self, content: Content):
+        self.content = content
+
+class Response:
+    def __init__(self, parts: list, chunks: list = None, delays: list = None):
+        self.candidates = [Candidate(Content(parts))]
+        self._chunks, self._delays = chunks or [], delays or []
+
+    def __iter__(self):
+        """Yields streamed chunks, sleeping before each one as the configured latency says."""
+        for chunk, delay in zip(self._chunks, self._delays):
+            time.sleep(delay); yield chunk
+
+# --- Recording and serving exchanges ---
+
+def _request_key(content, turn: dict) -> tuple:
+    """Keys a request by its turn's normalized prompt and the tool round within the turn."""
+    if isinstance(content, str):
+        turn["prompt"], turn["round"] = normalize_prompt(content), 0
+    else:
+        turn["round"] += 1
+    return turn["prompt"], turn["round"]
+
+class FixtureStore:
+    """Model exchanges as JSON lines of {"prompt", "round", "parts"}; the latest recording of a key wins."""
+
+    def __init__(self, path: str = MODEL_FIXTURES):
+        self.path = path
+        self._lock = threading.Lock()
+        self._exchanges = None
+
+    def _load(self) -> dict:
+        with self._lock:
+            if self._exchanges is None:
+                self._exchanges = {}
+                if os.path.exists(self.path):
+                    with open(self.path, encoding="utf-8") as f:
+                        for line in f:
+                            record = json.loads(line); self._exchanges[(record["prompt"], record["round"])] = record["parts"]
+            return self._exchanges
+
+    def get(self, key: tuple):
+        return self._load().get(key)
+
+    def add(self, key: tuple, parts: list):
+        exchanges = self._load()
+        with self._lock:
+            exchanges[key] = parts
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"prompt": key[0], "round": key[1], "parts": parts}, ensure_ascii=False, default=str) + "\n")
+
+class _RecordedStream:
+    """Passes a streamed response through and calls `on_done` once the caller has consumed it (and the SDK has aggregated it)."""
+
+    def __init__(self, response, on_done):
+        self._response, self._on_done = response, on_done
+
+    @property
+    def candidates(self): return self._response.candidates
+
+    def __iter__(self):
+        yield from self._response
+        self._on_done()
+
+class RecordingChat:
+    """Wraps a real chat session and saves every response it receives to a fixture store."""
+
+    def __init__(self, chat, model, store: FixtureStore):
+        self._chat, self.model, self._store, self._turn = chat, model, store, {"prompt": "", "round": 0}
+
+    @property
+    def history(self): return self._chat.history
+
+    @history.setter
+    def history(self, history): self._chat.history = history
+
+    def _record(self, key: tuple, response):
+        self._store.add(key, to_dicts([response.candidates[0].content])[0]["parts"])
+
+    def send_message(self, content, stream: bool = False):
+        key = _request_key(content, self._turn)
+        response = self._chat.send_message(content, stream=stream)
+        if not stream:
+            self._record(key, response); return response
+        return _RecordedStream(response, lambda: self._record(key, response))
+
+class RecordingModel:
+    def __init__(self, model, store: FixtureStore):
+        self._model, self._store = model, store
+
+    def start_chat(self, history=None):
+        return RecordingChat(self._model.start_chat(history=history or []), self, self._store)
+
+class StandInChat:
+    """A chat session answered locally: from recorded fixtures (replay) or by simple rules (scripted).
+
+    Replay misses fall back to the rules, so a partial recording still drives a full conversation.
+    Latency is simulated per response: MODEL_LATENCY_MS (± jitter) before the first chunk, then MODEL_CHUNK_MS per chunk.
+    """
+
+    def __init__(self, model, history=None):
+        self.model, self._history, self._turn = model, to_dicts(history or []), {"prompt": "", "round": 0}
+
+    @property
+    def history(self): return self._history
+
+    @history.setter
+    def history(self, history): self._history = to_dicts(history)
+
+    def send_message(self, content, stream: bool = False):
+        key = _request_key(content, self._turn)
+        parts = self.model.store.get(key) if self.model.store else None
+        self.model.count("replayed" if parts is not None else "scripted")
+        if parts is None: parts = scripted_reply(content)
+        request = [{"text": content}] if isinstance(content, str) else content
+        self._history += [{"role": "user", "parts": request}, {"role": "model", "parts": parts}]
+        return self.model.respond(parts, stream)
+
+class StandInModel:
+    def __init__(self, store: FixtureStore = None, latency_ms: float = MODEL_LATENCY_MS, jitter_ms: float = MODEL_LATENCY_JITTER_MS,
+                 chunk_ms: float = MODEL_CHUNK_MS, chunks: int = MODEL_STREAM_CHUNKS, seed: int = None):
+        self.store, self.latency_ms, self.jitter_ms, self.chunk_ms, self.chunks = store, latency_ms, jitter_ms, chunk_ms, chunks
+        self._rng, self._lock = random.Random(seed), threading.Lock()
+        self.counters = {"replayed": 0, "scripted": 0}
+
+    def count(self, counter: str):
+        with self._lock: self.counters[counter] += 1
+
+    def start_chat(self, history=None):
+        return StandInChat(self, history)
+
+    def _first_delay(self) -> float:
+        with self._lock: jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def respond(self, part_dicts: list, stream: bool) -> Response:
+        parts = [Part.from_dict(part) for part in part_dicts]
+        if not stream:
+            time.sleep(self._first_delay()); return Response(parts)
+        text = "".join(part.text for part in parts)
+        size = max(1, -(-len(text) // self.chunks))
+        chunks = [Response([Part(text=text[i:i + size])]) for i in range(0, len(text), size)]
+        chunks += [Response([part]) for part in parts if part.function_call.name]
+        chunks = chunks or [Response([Part()])]
+        return Response(parts, chunks, [self._first_delay()] + [self.chunk_ms / 1000] * (len(chunks) - 1))
+
+# --- Scripted replies ---
+
+def scripted_reply(content) -> list:
+    """Answers like the real assistant would, closely enough to exercise the same tools with realistic arguments."""
+    if isinstance(content, str):
+        prompt = normalize_prompt(content)
+        if "who made you" in prompt or "who created you" in prompt: return [{"text": "I was created by Taha."}]
+        if "my details" in prompt or "my account" in prompt: return [{"function_call": {"name": "get_my_details", "args": {}}}]
+        for verb, tool in (("reserve ", "reserve_book"), ("cancel ", "cancel_reservation")):
+            if content.lower().startswith(verb): return [{"function_call": {"name": tool, "args": {"title": content[len(verb):].strip()}}}]
+        from .vector_index import MOOD_WORDS
+        if set(prompt.split()) & set(MOOD_WORDS) or "recommend" in prompt:
+            return [{"function_call": {"name": "suggest_books_by_mood", "args": {"mood": content}}}]
+        query = re.sub(r"^(do you have|have you got|find|search for|i'm looking for)\s+|[?!.]+$", "", content.strip(), flags=re.IGNORECASE)
+        return [{"function_call": {"name": "search_books", "args": {"query": query}}}]
+    replies = []
+    for part in content:
+        output = part["function_response"]["response"]["content"]
+        note = output.get("note") if isinstance(output, dict) and "books" in output else None
+        if note: output = output["books"]
+        if isinstance(output, list) and not output:
+            replies.append("I couldn't find any matching books in our catalog.")
+        elif isinstance(output, list):
+            titles = ", ".join(f"'{book['title']}' by {book['author']}" for book in output[:3])
+            replies.append(f"I found {len(output)} books, including {titles}. Would you like to reserve one?" + (" " + note if note else ""))
+        elif isinstance(output, dict):
+            replies.append(f"Here are your details: {output.get('name')}, {output.get('email')}, member since {output.get('join_date')}.")
+        else:
+            replies.append(str(output))
+    return [{"text": " ".join(replies)}]
+
+def load_backend(name: str = MODEL_BACKEND, real_model=None):
+    """Returns the model for MODEL_BACKEND: `real_model` itself, a recording wrapper around it, or a local stand-in."""
+    if name == "gemini": return real_model
+    if name == "record": return RecordingModel(real_model, FixtureStore())
+    if name == "replay": return StandInModel(FixtureStore())
+    if name == "scripted": return StandInModel()
+    raise ValueError(f"Unknown MODEL_BACKEND '{name}' (expected gemini, record, replay or scripted)")
@@ -0,0 +1,56 @@
+# assistant/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class TTLCache:
+    """A thread-safe in-process LRU cache whose entries expire after a per-entry TTL."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0):
+        self.maxsize, self.ttl = maxsize, ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key, default=None):
+        """Returns the cached value for `key`, or `default` if it is missing or expired."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1; return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]; self.expirations += 1; self.misses += 1
+                return default
+            self._data.move_to_end(key); self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """Stores `value` under `key`, evicting the least recently used entries when full."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False); self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Removes `key` from the cache and returns its value."""
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock: self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Returns hit/miss/eviction counters for monitoring."""
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "expirations": self.expirations}
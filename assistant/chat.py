@@ -0,0 +1,120 @@
+# assistant/chat.py
+
+import os
+import time
+from . import service, tracing
+from .gemini_tools import available_tools
+from .response_cache import ResponseCache
+
+MAX_TOOL_ROUNDS = 8  # Guards against a model that keeps calling tools forever.
+MEMBER_SCOPED_TOOLS = {"reserve_book", "cancel_reservation", "get_my_details"}  # The member ID comes from the session, never the model.
+BOOK_LIST_TOOLS = {"search_books", "suggest_books_by_mood"}  # Their list outputs are shown as book cards.
+CACHE_BYPASS_TOOLS = {"reserve_book", "cancel_reservation", "add_book"}  # Turns that change state are never replayed from the cache.
+CARD_ONLY_FIELDS = {"cover_path"}  # Book fields the UI needs for its cards but the model never sees.
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+
+response_cache = ResponseCache()
+
+def function_calls(response) -> list:
+    """Returns every function call part of a model response, not just the first one."""
+    return [part.function_call for part in response.candidates[0].content.parts if part.function_call.name]
+
+def response_text(response) -> str:
+    """Concatenates the text parts of a model response."""
+    return "".join(part.text for part in response.candidates[0].content.parts if part.text)
+
+def _tool_result(name: str, future):
+    """Waits for a tool call, returning its output or an error message the model can react to."""
+    if future is None: return f"Error: Unknown tool '{name}'."
+    try: return future.result(service.CALL_TIMEOUT)
+    except Exception as e:
+        print(f"Error in tool '{name}': {e}"); return f"Error: {e}"
+
+def run_tools(calls: list, member_id: int) -> list:
+    """Runs a response's tool calls concurrently on the tool service and returns [(name, output)] in call order.
+
+    `calls` holds SDK function calls or (name, args) pairs.
+    """
+    jobs = [call if isinstance(call, tuple) else (call.name, {key: value for key, value in call.args.items()}) for call in calls]
+    for name, args in jobs:
+        if name in MEMBER_SCOPED_TOOLS: args["member_id"] = member_id
+    futures = [service.submit(name, **args) if name in available_tools else None for name, args in jobs]
+    return [(name, _tool_result(name, future)) for (name, _), future in zip(jobs, futures)]
+
+def run_tool(name: str, args: dict, member_id: int):
+    """Runs one tool call, returning its output or an error message."""
+    return run_tools([(name, args)], member_id)[0][1]
+
+def _for_model(output):
+    """Drops card-only fields (local thumbnail paths) from a book list before it goes to the model and the chat history.
+
+    A list with a `note` (see `tools.SearchResults`) is sent as {"books", "note"} so the model sees both.
+    """
+    if not isinstance(output, list): return output
+    books = [{k: v for k, v in book.items() if k not in CARD_ONLY_FIELDS} if isinstance(book, dict) else book for book in output]
+    note = getattr(output, "note", None)
+    return {"books": books, "note": note} if note else books
+
+def function_response_parts(results: list) -> list:
+    return [{"function_response": {"name": name, "response": {"content": _for_model(output)}}} for name, output in results]
+
+def _send(chat, content, on_text):
+    """Sends one message; when `on_text` is given, streams and forwards each text chunk as it arrives."""
+    with tracing.span("gemini.send_message", stage="gemini", stream=on_text is not None):
+        if on_text is None: return chat.send_message(content)
+        response = chat.send_message(content, stream=True)
+        for chunk in response:  # The SDK aggregates chunks (function calls included) into `response` as we iterate.
+            if not chunk.candidates: continue
+            for part in chunk.candidates[0].content.parts:
+                if part.text: on_text(part.text)
+        return response
+
+def run_turn(chat, message: str, member_id: int, on_text=None, stats: dict = None, lang: str = "en") -> str:
+    """Sends a user message and resolves the model's tool calls until it answers with text.
+
+    All function calls in a response are executed together and answered in a single message,
+    so a turn costs one model round trip per *round* of tool use rather than per tool.
+    With `on_text`, replies are streamed and each text chunk is passed to it as soon as it arrives.
+    `stats`, if given, receives the time to first token, total time, number of tool rounds and the books
+    returned by `search_books`/`suggest_books_by_mood` during the turn (so the UI can show them as cards).
+    Repeated prompts are answered from `response_cache` without a model round trip (`stats["cached"]`);
+    the replayed turn is appended to the chat history so the conversation continues as if it had run.
+    """
+    started = time.perf_counter()
+    stats = stats if stats is not None else {}
+    stats.update(ttft_ms=None, tool_rounds=0, books=[], cached=False)
+    def first_token(text):
+        if stats["ttft_ms"] is None: stats["ttft_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        on_text(text)
+    stream = first_token if on_text else None
+    with tracing.span("turn", stage="turn") as turn_span:
+        if RESPONSE_CACHE_ENABLED:
+            keys = response_cache.keys(message, lang, member_id, chat.history)
+            if (hit := response_cache.get(keys)) is not None:
+                chat.history = chat.history + hit["contents"]
+                if on_text: on_text(hit["text"])
+                stats.update(cached=True, books=[dict(book) for book in hit["books"]])
+                stats["total_ms"] = stats["ttft_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                turn_span.set(cached=True)
+                return hit["text"]
+        turn_start, tools_used = len(chat.history), set()
+        response = _send(chat, message, stream)
+        for _ in range(MAX_TOOL_ROUNDS):
+            calls = function_calls(response)
+            if not calls: break
+            stats["tool_rounds"] += 1
+            tools_used.update(fc.name for fc in calls)
+            results = run_tools(calls, member_id)
+            stats["books"] += [book for name, output in results if name in BOOK_LIST_TOOLS and isinstance(output, list) for book in output]
+            response = _send(chat, function_response_parts(results), stream)
+        text = response_text(response)
+        turn_span.set(tool_rounds=stats["tool_rounds"], ttft_ms=stats["ttft_ms"])
+        if RESPONSE_CACHE_ENABLED:
+            if not text or tools_used & CACHE_BYPASS_TOOLS: response_cache.bypass()
+            else:
+                key = keys[1] if tools_used & MEMBER_SCOPED_TOOLS else keys[0]
+                version = keys[2] if tools_used & BOOK_LIST_TOOLS else None  # Only catalog reads go stale when inventory changes.
+                response_cache.put(key, text, chat.history[turn_start:], [dict(book) for book in stats["books"]], catalog_version=version)
+    stats["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    if stats["ttft_ms"] is None: stats["ttft_ms"] = stats["total_ms"]  # Without streaming the first token is the whole reply.
+    return text
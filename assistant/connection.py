@@ -0,0 +1,82 @@
+# assistant/connection.py
+
+import os
+import sqlite3
+import threading
+from .schema import migrate
+
+DB_PATH = os.environ.get("LIBRARY_DB_PATH") or os.path.join(os.path.dirname(__file__), '..', 'library.db')
+BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))  # Wait for a writer instead of raising "database is locked".
+MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", 256 * 1024 * 1024))
+STATEMENT_CACHE_SIZE = 256
+
+class ConnectionPool:
+    """Hands every thread its own long-lived, WAL-mode connection to one database file.
+
+    SQLite connections are cheap to keep but costly to open, and a connection must not be used by two
+    threads at once, so the pool keeps one per thread and closes those whose thread has exited.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}  # thread -> connection
+        self.opened = self.reused = self.closed = 0
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")  # Readers no longer block the writer, and vice versa.
+        conn.execute("PRAGMA synchronous=NORMAL")  # Durable across app crashes; only an OS crash can lose the last commits.
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        migrate(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Returns the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self.reused += 1; return conn
+        conn = self._local.conn = self._open()
+        with self._lock:
+            self.opened += 1
+            self._connections[threading.current_thread()] = conn
+            # Streamlit runs each rerun on a fresh thread; reclaim connections left behind by finished ones.
+            for thread in [t for t in self._connections if not t.is_alive()]:
+                self._connections.pop(thread).close(); self.closed += 1
+        return conn
+
+    def close_all(self):
+        """Closes every pooled connection; threads transparently reopen on their next call."""
+        with self._lock:
+            for conn in self._connections.values(): conn.close()
+            self.closed += len(self._connections); self._connections.clear()
+        self._local = threading.local()
+
+    def stats(self) -> dict:
+        """Returns pool counters for monitoring."""
+        with self._lock:
+            return {"db_path": self.db_path, "open": len(self._connections), "opened": self.opened,
+                    "reused": self.reused, "closed": self.closed}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str = None) -> ConnectionPool:
+    """Returns the shared pool for `db_path` (default: DB_PATH), creating it on first use."""
+    db_path = os.path.abspath(db_path or DB_PATH)
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock: pool = _pools.setdefault(db_path, ConnectionPool(db_path))
+    return pool
+
+def get_connection(db_path: str = None) -> sqlite3.Connection:
+    """Returns this thread's persistent connection to the library database. Do not close it."""
+    return get_pool(db_path).connection()
+
+def pool_stats() -> list:
+    """Returns the stats of every pool opened in this process."""
+    return [pool.stats() for pool in list(_pools.values())]
@@ -0,0 +1,88 @@
+# assistant/covers.py
+
+import os
+import threading
+import time
+from . import tracing
+from .cache import TTLCache
+
+COVER_CACHE_TTL = float(os.environ.get("COVER_CACHE_TTL", 7 * 24 * 3600))  # Found covers rarely change.
+COVER_CACHE_NEGATIVE_TTL = float(os.environ.get("COVER_CACHE_NEGATIVE_TTL", 6 * 3600))  # Retry "no cover" sooner.
+COVER_CACHE_SIZE = int(os.environ.get("COVER_CACHE_SIZE", 4096))
+COVER_CACHE_PURGE_EVERY = int(os.environ.get("COVER_CACHE_PURGE_EVERY", 1000))  # Writes between sweeps of expired rows.
+
+def cover_cache_key(title: str, author: str) -> str:
+    """Normalizes a (title, author) pair so trivial spelling variants share a cache entry."""
+    return " ".join(title.casefold().split()) + "|" + " ".join(author.casefold().split())
+
+class CoverCache:
+    """Two-tier cover URL cache: an in-process LRU in front of the `cover_cache` table in library.db.
+
+    An empty string is a valid cached value and means "Google Books has no cover for this book".
+    """
+
+    def __init__(self, connect, maxsize: int = COVER_CACHE_SIZE, ttl: float = COVER_CACHE_TTL,
+                 negative_ttl: float = COVER_CACHE_NEGATIVE_TTL):
+        self._connect = connect
+        self.ttl, self.negative_ttl = ttl, negative_ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.disk_hits = self.disk_misses = self.negative_hits = 0
+        self._writes, self._writes_lock = 0, threading.Lock()
+
+    @tracing.traced("db.cover_cache.get", stage="db")
+    def get_many(self, pairs) -> dict:
+        """Looks up many (title, author) pairs at once; returns {(title, author): url} for the cached ones."""
+        found, pending = {}, {}
+        for title, author in pairs:
+            url = self.memory.get(cover_cache_key(title, author))
+            if url is None: pending[cover_cache_key(title, author)] = (title, author)
+            else: found[(title, author)] = url
+        if pending:
+            conn = self._connect()
+            now = time.time(); keys = list(pending)
+            for start in range(0, len(keys), 500):  # Stay under SQLite's bound-parameter limit.
+                chunk = keys[start:start + 500]
+                rows = conn.execute(f"SELECT key, url, expires_at FROM cover_cache WHERE key IN ({','.join('?' * len(chunk))}) AND expires_at > ?", (*chunk, now)).fetchall()
+                for key, url, expires_at in rows:
+                    self.memory.set(key, url, ttl=expires_at - now)
+                    found[pending[key]] = url; self.disk_hits += 1
+            self.disk_misses += sum(1 for pair in pending.values() if pair not in found)
+        self.negative_hits += sum(1 for url in found.values() if url == "")
+        return found
+
+    def get(self, title: str, author: str):
+        """Returns the cached cover URL ("" for a cached miss), or None if the pair has not been looked up."""
+        return self.get_many([(title, author)]).get((title, author))
+
+    @tracing.traced("db.cover_cache.set", stage="db")
+    def set_many(self, items: dict):
+        """Stores {(title, author): url} results in both tiers, using the negative TTL for empty URLs."""
+        if not items: return
+        now, rows = time.time(), []
+        for (title, author), url in items.items():
+            ttl = self.ttl if url else self.negative_ttl
+            key = cover_cache_key(title, author)
+            self.memory.set(key, url, ttl=ttl)
+            rows.append((key, url, now + ttl))
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO cover_cache (key, url, expires_at) VALUES (?, ?, ?)", rows)
+        with self._writes_lock:
+            self._writes += len(rows)
+            purge, self._writes = self._writes >= COVER_CACHE_PURGE_EVERY, self._writes % COVER_CACHE_PURGE_EVERY
+        if purge: self.purge_expired()  # Expired rows are never served, so they only need sweeping now and then.
+
+    @tracing.traced("db.cover_cache.purge", stage="db")
+    def purge_expired(self) -> int:
+        """Deletes expired rows from the persistent tier and returns how many were removed."""
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM cover_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def set(self, title: str, author: str, url: str):
+        self.set_many({(title, author): url})
+
+    def stats(self) -> dict:
+        """Returns hit/miss/eviction counters across both tiers."""
+        memory = self.memory.stats()
+        return {"memory_hits": memory["hits"], "disk_hits": self.disk_hits, "misses": self.disk_misses,
+                "negative_hits": self.negative_hits, "evictions": memory["evictions"],
+                "expirations": memory["expirations"], "memory_size": memory["size"]}
@@ -1,29 +1,40 @@
 # assistant/database.py (Final Bug-Fix Version)
-# (No changes from the previous version, but included for completeness)
-import sqlite3, os
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'library.db')
+# Member rows are served from a read-through cache shared by every session; writes to `members` invalidate it.
+import os
+import sqlite3
+import string
+from . import tracing
+from .cache import TTLCache
+from .connection import get_connection
+MEMBER_CACHE_SIZE = int(os.environ.get("MEMBER_CACHE_SIZE", 10000))
+MEMBER_CACHE_TTL = float(os.environ.get("MEMBER_CACHE_TTL", 300))  # Bounds staleness if another process edits a member.
+member_cache = TTLCache(maxsize=MEMBER_CACHE_SIZE, ttl=MEMBER_CACHE_TTL)  # member_id -> row dict
+_SQL_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)  # SQLite's lower() folds ASCII letters only.
 def _connect_db():
-    conn = sqlite3.connect(DB_PATH); conn.row_factory = sqlite3.Row; return conn
+    return get_connection()
+def _cached(member_id: int, row) -> dict:
+    member = dict(row); member_cache.set(member_id, member)
+    return dict(member)
+def invalidate_member(member_id: int):
+    """Drops a member from the cache after their row was written (row IDs of deleted members can be reused)."""
+    member_cache.pop(member_id)
+@tracing.traced("db.check_member_credentials", stage="db")
 def check_member_credentials(member_id: int, name: str):
-    conn = _connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM members WHERE id = ? AND lower(name) = ?", (member_id, name.lower().strip()))
-    member = cursor.fetchone()
-    conn.close()
-    return dict(member) if member else None
+    member = member_cache.get(member_id)
+    if member is not None:  # Same comparison as the query below, without the round trip.
+        return dict(member) if member["name"].translate(_SQL_LOWER) == name.lower().strip() else None
+    member = _connect_db().execute("SELECT * FROM members WHERE id = ? AND lower(name) = ?", (member_id, name.lower().strip())).fetchone()
+    return _cached(member_id, member) if member else None
+@tracing.traced("db.signup_member", stage="db")
 def signup_member(name: str, email: str) -> str:
-    conn = _connect_db()
     try:
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO members (name, email) VALUES (?, ?)", (name, email))
-        conn.commit()
+        with _connect_db() as conn: cursor = conn.execute("INSERT INTO members (name, email) VALUES (?, ?)", (name, email))
+        invalidate_member(cursor.lastrowid)
         return f"Success! You are now a member. Your new Member ID is {cursor.lastrowid}. Please use it to log in."
     except sqlite3.IntegrityError: return "Error: A member with this email already exists."
-    finally: conn.close()
+@tracing.traced("db.find_member_by_id", stage="db")
 def find_member_by_id(member_id: int):
-    conn = _connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM members WHERE id = ?", (member_id,))
-    member = cursor.fetchone()
-    conn.close()
-    return dict(member) if member else None
\ No newline at end of file
+    member = member_cache.get(member_id)
+    if member is not None: return dict(member)
+    member = _connect_db().execute("SELECT * FROM members WHERE id = ?", (member_id,)).fetchone()
+    return _cached(member_id, member) if member else None
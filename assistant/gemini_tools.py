@@ -1,23 +1,40 @@
 # assistant/gemini_tools.py
 
-import google.generativeai as genai
+import functools
 from . import tools
 
+# Declarations are plain dicts, so importing this module does not load the Gemini SDK (see `all_gemini_tools`).
+
 # --- NEW: Function Declaration for the Book Search Tool ---
-search_books_func = genai.types.FunctionDeclaration(
+search_books_func = dict(
     name="search_books",
-    description="Searches the library catalog for books by title or author to find details and availability.",
+    description="Searches the library catalog for books by title, author or genre to find details and availability. Results are ranked by relevance and paged.",
     parameters={
         "type": "OBJECT",
         "properties": {
-            "query": {"type": "STRING", "description": "The title or author of the book to search for"},
+            "query": {"type": "STRING", "description": "The title, author or genre of the book to search for"},
+            "limit": {"type": "INTEGER", "description": "The maximum number of books to return (default 10)"},
+            "offset": {"type": "INTEGER", "description": "The number of ranked results to skip, for fetching further pages"},
         },
         "required": ["query"],
     },
 )
 
+suggest_books_by_mood_func = dict(
+    name="suggest_books_by_mood",
+    description="Recommends books that are in stock in our catalog for a mood, feeling or genre, most similar first.",
+    parameters={
+        "type": "OBJECT",
+        "properties": {
+            "mood": {"type": "STRING", "description": "The mood or genre, optionally with related words, e.g. 'adventurous fantasy'"},
+            "limit": {"type": "INTEGER", "description": "The maximum number of books to return (default 5)"},
+        },
+        "required": ["mood"],
+    },
+)
+
 # --- Existing Function Declarations ---
-add_book_func = genai.types.FunctionDeclaration(
+add_book_func = dict(
     name="add_book",
     description="Adds a new book to the library catalog. Only for admin use.",
     parameters={
@@ -32,15 +49,15 @@ add_book_func = genai.types.FunctionDeclaration(
     },
 )
 
-get_my_details_func = genai.types.FunctionDeclaration(
+get_my_details_func = dict(
     name="get_my_details",
     description="Retrieves the library member details for the currently logged-in user.",
     parameters={"type": "OBJECT", "properties": {}},
 )
 
-reserve_book_func = genai.types.FunctionDeclaration(
+reserve_book_func = dict(
     name="reserve_book",
-    description="Reserves a specific book for the currently logged-in user after they have been shown the details.",
+    description="Reserves a specific book for the currently logged-in user after they have been shown the details. If no copy is free, the user joins the waiting list.",
     parameters={
         "type": "OBJECT",
         "properties": {
@@ -50,20 +67,42 @@ reserve_book_func = genai.types.FunctionDeclaration(
     },
 )
 
+cancel_reservation_func = dict(
+    name="cancel_reservation",
+    description="Cancels the currently logged-in user's reservation or waiting-list place for a book.",
+    parameters={
+        "type": "OBJECT",
+        "properties": {
+             "title": {"type": "STRING", "description": "The exact title of the reserved book"},
+        },
+        "required": ["title"],
+    },
+)
+
 # You would also add a declaration for 'add_member' if you want the AI to use it, but for now we'll keep it manual for the admin.
 
 # --- Updated Tool Lists ---
-all_gemini_tools = [
+TOOL_DECLARATIONS = [
     search_books_func,  # Add the new tool here
+    suggest_books_by_mood_func,
     add_book_func,
     get_my_details_func,
-    reserve_book_func
+    reserve_book_func,
+    cancel_reservation_func,
 ]
 
+@functools.lru_cache(maxsize=None)
+def all_gemini_tools() -> tuple:
+    """Builds the SDK's FunctionDeclarations once; google.generativeai is only imported on first use."""
+    import google.generativeai as genai
+    return tuple(genai.types.FunctionDeclaration(**declaration) for declaration in TOOL_DECLARATIONS)
+
 available_tools = {
     "search_books": tools.search_books, # And here
+    "suggest_books_by_mood": tools.suggest_books_by_mood,
     "add_book": tools.add_book,
     "get_my_details": tools.get_my_details,
     "reserve_book": tools.reserve_book,
+    "cancel_reservation": tools.cancel_reservation,
     "add_member": tools.add_member,
 }
\ No newline at end of file
@@ -0,0 +1,110 @@
+# assistant/history.py
+
+import json
+import os
+from collections.abc import Mapping, Sequence
+
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", 6000))
+HISTORY_KEEP_TURNS = int(os.environ.get("HISTORY_KEEP_TURNS", 6))  # Most recent turns always sent verbatim.
+SUMMARY_PREFIX = "Summary of our earlier conversation:"
+SUMMARY_ACK = "Understood, I'll keep that in mind."
+SUMMARY_MAX_LINES = 40  # The running summary forgets its oldest lines beyond this.
+DIGEST_MAX_BOOKS = 5
+
+def _plain(value):
+    """Converts proto map/repeated composites from the SDK into plain dicts and lists."""
+    if isinstance(value, Mapping): return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        return [_plain(item) for item in value]
+    return value
+
+def _part_dict(part) -> dict:
+    if isinstance(part, dict): return part
+    if part.function_call.name:
+        return {"function_call": {"name": part.function_call.name, "args": _plain(part.function_call.args)}}
+    if part.function_response.name:
+        return {"function_response": {"name": part.function_response.name, "response": _plain(part.function_response.response)}}
+    return {"text": part.text}
+
+def to_dicts(history) -> list:
+    """Returns chat history (SDK Content objects or dicts) as plain {"role", "parts"} dicts."""
+    return [content if isinstance(content, dict) else {"role": content.role, "parts": [_part_dict(part) for part in content.parts]}
+            for content in history]
+
+def estimate_tokens(contents: list) -> int:
+    """Cheap local token estimate (~4 characters per token); avoids a count_tokens round trip per turn."""
+    return len(json.dumps(contents, ensure_ascii=False, default=str)) // 4
+
+def _is_user_prompt(content: dict) -> bool:
+    return content["role"] == "user" and any("text" in part for part in content["parts"])
+
+def _split_turns(contents: list) -> list:
+    """Groups contents into turns, each starting at a user prompt and including its tool exchanges."""
+    turns = []
+    for content in contents:
+        if _is_user_prompt(content) or not turns: turns.append([content])
+        else: turns[-1].append(content)
+    return turns
+
+def digest_tool_output(output) -> str:
+    """Shrinks a tool result to a one-line digest, e.g. a search result list to its titles."""
+    if isinstance(output, list) and all(isinstance(item, Mapping) for item in output):
+        titles = [f"{item.get('title')} by {item.get('author')} ({item.get('copies')} copies)" for item in output[:DIGEST_MAX_BOOKS]]
+        more = f" and {len(output) - DIGEST_MAX_BOOKS} more" if len(output) > DIGEST_MAX_BOOKS else ""
+        return f"{len(output)} books: " + "; ".join(titles) + more
+    if isinstance(output, Mapping):
+        return ", ".join(f"{key}={value}" for key, value in output.items() if key != "cover_url")[:300]
+    return str(output)[:300]
+
+def _digest_turn(turn: list) -> list:
+    digested = []
+    for content in turn:
+        parts = []
+        for part in content["parts"]:
+            response = part.get("function_response")
+            if response and not response.get("response", {}).get("digest"):
+                output = response.get("response", {}).get("content")
+                part = {"function_response": {"name": response["name"], "response": {"content": digest_tool_output(output), "digest": True}}}
+            parts.append(part)
+        digested.append({"role": content["role"], "parts": parts})
+    return digested
+
+def _summarize_turn(turn: list) -> str:
+    prompt = " ".join(part["text"] for part in turn[0]["parts"] if "text" in part)
+    reply = " ".join(part["text"] for content in turn if content["role"] == "model" for part in content["parts"] if "text" in part)
+    tools = sorted({part["function_call"]["name"] for content in turn for part in content["parts"] if "function_call" in part})
+    used = f" (used {', '.join(tools)})" if tools else ""
+    return f"- User: {prompt[:160]} / Assistant{used}: {reply[:200]}"
+
+def compact_history(history, budget: int = HISTORY_TOKEN_BUDGET, keep_turns: int = HISTORY_KEEP_TURNS):
+    """Fits chat history into a token budget and returns (contents, stats).
+
+    The last `keep_turns` turns are kept verbatim. Tool outputs in older turns are replaced by compact digests,
+    and if that is not enough, the oldest turns are folded into a running summary at the start of the history.
+    """
+    contents = to_dicts(history)
+    before = estimate_tokens(contents)
+    turns = _split_turns(contents)
+    summary = []
+    if turns and turns[0][0]["parts"] and turns[0][0]["parts"][0].get("text", "").startswith(SUMMARY_PREFIX):
+        summary = turns.pop(0)[0]["parts"][0]["text"][len(SUMMARY_PREFIX):].strip().splitlines()
+    recent = turns[-keep_turns:] if keep_turns else []
+    older = [_digest_turn(turn) for turn in turns[:len(turns) - len(recent)]]
+
+    def assemble():
+        head = [{"role": "user", "parts": [{"text": SUMMARY_PREFIX + "\n" + "\n".join(summary[-SUMMARY_MAX_LINES:])}]},
+                {"role": "model", "parts": [{"text": SUMMARY_ACK}]}] if summary else []
+        return head + [content for turn in older + recent for content in turn]
+
+    compacted = assemble()
+    while older and estimate_tokens(compacted) > budget:
+        summary.append(_summarize_turn(older.pop(0)))
+        compacted = assemble()
+    after = estimate_tokens(compacted)
+    return compacted, {"tokens_before": before, "tokens_after": after, "tokens_saved": before - after}
+
+def compact_chat(chat, budget: int = HISTORY_TOKEN_BUDGET, keep_turns: int = HISTORY_KEEP_TURNS):
+    """Returns (chat, stats): a chat session rebuilt from compacted history, or the same one if nothing changed."""
+    compacted, stats = compact_history(chat.history, budget, keep_turns)
+    if stats["tokens_saved"] <= 0: return chat, stats
+    return chat.model.start_chat(history=compacted), stats
@@ -0,0 +1,137 @@
+# assistant/http_client.py
+
+import os
+import random
+import threading
+import time
+
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 1.0))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 5.0))
+MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 2))  # Extra attempts after the first, for timeouts, resets and 429/5xx.
+RETRY_BACKOFF = float(os.environ.get("HTTP_RETRY_BACKOFF", 0.2))  # Base seconds; each retry sleeps a random 0..base*2^n.
+RETRY_BACKOFF_MAX = 2.0
+BREAKER_THRESHOLD = int(os.environ.get("HTTP_BREAKER_THRESHOLD", 5))  # Consecutive failed calls that open the breaker.
+BREAKER_COOLDOWN = float(os.environ.get("HTTP_BREAKER_COOLDOWN", 30.0))  # Seconds open before one trial call is let through.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of making a request while a host's breaker is open; callers should degrade right away."""
+
+class CircuitBreaker:
+    """Stops calling a host after BREAKER_THRESHOLD consecutive failures, then lets one trial call through per cooldown.
+
+    A successful trial closes the breaker again; a failed one keeps it open for another cooldown.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold, self.cooldown = threshold, cooldown
+        self._lock = threading.Lock()
+        self.state, self.failures, self.opened_at, self.times_opened = CLOSED, 0, 0.0, 0
+        self._trial_running = False
+
+    def _cooled_down(self) -> bool:
+        return self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown
+
+    def available(self) -> bool:
+        """True if a call would be attempted now; does not claim the half-open trial."""
+        with self._lock: return self.state == CLOSED or self._cooled_down() or (self.state == HALF_OPEN and not self._trial_running)
+
+    def allow(self) -> bool:
+        """Claims permission for one call: always when closed, and for a single trial once the cooldown has passed."""
+        with self._lock:
+            if self.state == CLOSED: return True
+            if self._cooled_down(): self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True; return True
+            return False
+
+    def record_success(self):
+        with self._lock: self.state, self.failures, self._trial_running = CLOSED, 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.threshold):
+                self.state, self.opened_at = OPEN, time.monotonic(); self.times_opened += 1
+            self._trial_running = False
+
+class HttpClient:
+    """A keep-alive session for one upstream with connect/read timeouts, bounded jittered retries and a circuit breaker.
+
+    requests is imported when the first call is made, not at startup.
+    """
+
+    def __init__(self, name: str, pool_maxsize: int = 10, connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT,
+                 retries: int = MAX_RETRIES, backoff: float = RETRY_BACKOFF, breaker: CircuitBreaker = None):
+        self.name, self.pool_maxsize = name, pool_maxsize
+        self.timeout, self.retries, self.backoff = (connect_timeout, read_timeout), retries, backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._session = None
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0, "short_circuited": 0}
+
+    def _count(self, counter: str):
+        with self._lock: self.counters[counter] += 1
+
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize))
+                session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize))
+                self._session = session
+            return self._session
+
+    def available(self) -> bool:
+        """False while the breaker is open, so callers can skip optional lookups without trying."""
+        return self.breaker.available()
+
+    def get(self, url: str, **kwargs):
+        """GETs `url` and returns the response, retrying transient failures; raises CircuitOpenError or a requests exception.
+
+        Responses with a status outside RETRY_STATUSES (404s included) count as the upstream working.
+        """
+        import requests
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError(f"{self.name} is unavailable; skipping the request for {self.breaker.cooldown:.0f}s after repeated failures")
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count("retries")
+                time.sleep(random.uniform(0, min(RETRY_BACKOFF_MAX, self.backoff * 2 ** (attempt - 1))))
+            try:
+                response = self.session().get(url, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success(); self._count("succeeded")
+                    return response
+                response.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                error = e
+            except requests.RequestException:  # A bad URL or similar; retrying cannot help.
+                self.breaker.record_failure(); self._count("failed"); raise
+        self.breaker.record_failure(); self._count("failed")
+        raise error
+
+    def stats(self) -> dict:
+        with self._lock: counters = dict(self.counters)
+        return {"state": self.breaker.state, "consecutive_failures": self.breaker.failures, "times_opened": self.breaker.times_opened, **counters}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def client(name: str, **settings) -> HttpClient:
+    """Returns the shared client for upstream `name`, created with `settings` on first use."""
+    with _clients_lock:
+        if name not in _clients: _clients[name] = HttpClient(name, **settings)
+        return _clients[name]
+
+def stats() -> dict:
+    """Returns breaker state and call, retry, failure and short-circuit counters for every upstream."""
+    with _clients_lock: clients = dict(_clients)
+    return {name: http.stats() for name, http in clients.items()}
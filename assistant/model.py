@@ -0,0 +1,30 @@
+# assistant/model.py
+
+import functools
+import os
+from .backends import MODEL_BACKEND, load_backend
+from .gemini_tools import all_gemini_tools
+
+MODEL_NAME = os.environ.get("GEMINI_MODEL", "gemini-1.5-flash-latest")
+SYSTEM_INSTRUCTION = (
+    "You are an AI Book's Assistant. Your creator is a brilliant developer named Taha. When asked 'who made you' or any similar question, you must proudly say: 'I was created by Taha'. "
+    "Your most important rule is to **detect the user's language and respond ONLY in that same language.** Your responses should be concise and clear for the text-to-speech engine. "
+    "Your protocol is strict: "
+    "1. **Persona**: Be friendly, knowledgeable, and enthusiastic. "
+    "2. **Clarify First**: If a user's request is vague, ask clarifying questions in their language. "
+    "3. **Catalog Research**: For SPECIFIC book/author queries, you MUST use the `search_books` tool. "
+    "4. **Mood Recommendation**: For MOOD or GENRE requests, use the `suggest_books_by_mood` tool with the mood and related genre words, and recommend from its results. Only if it finds nothing, use your own knowledge and say those books are not in our catalog. "
+    "5. **Propose Actions**: After a successful search or recommendation, you MUST proactively ask the user, in their language, if they want to reserve a book. "
+    "6. **Execute Actions**: If they confirm, use the `reserve_book` tool. If they want to cancel a reservation, use the `cancel_reservation` tool."
+)
+
+@functools.lru_cache(maxsize=None)
+def load_model():
+    """Builds the model once per process; google.generativeai is imported here rather than at startup.
+
+    With MODEL_BACKEND=replay or scripted no Gemini model is built at all (see assistant/backends.py).
+    """
+    if MODEL_BACKEND in ("replay", "scripted"): return load_backend()
+    import google.generativeai as genai
+    genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
+    return load_backend(real_model=genai.GenerativeModel(MODEL_NAME, tools=list(all_gemini_tools()), system_instruction=SYSTEM_INSTRUCTION))
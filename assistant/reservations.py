@@ -0,0 +1,102 @@
+# assistant/reservations.py
+
+from contextlib import contextmanager
+from . import tracing
+from .connection import get_connection
+from .schema import bump_catalog_version
+
+HELD, WAITING, CANCELLED = "held", "waiting", "cancelled"
+
+@contextmanager
+def _immediate(conn):
+    """Runs a block as one BEGIN IMMEDIATE transaction, so concurrent reservations queue for the write lock
+    instead of reading the same `copies` value and both taking the last copy."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback(); raise
+
+def _find_book(conn, title: str):
+    """Finds a book by exact title, falling back to a case-insensitive match through the full-text index."""
+    book = conn.execute("SELECT id, title FROM books WHERE title = ?", (title,)).fetchone()
+    if book or not title.strip(): return book
+    phrase = 'title : "' + title.replace('"', '""') + '"'
+    for candidate in conn.execute("SELECT id, title FROM books WHERE id IN (SELECT rowid FROM books_fts WHERE books_fts MATCH ?)", (phrase,)):
+        if candidate["title"].casefold() == title.casefold(): return candidate
+    return None
+
+def _outcome(conn, reservation, title: str, replayed: bool) -> dict:
+    position = None
+    if reservation["status"] == WAITING:
+        position = conn.execute("SELECT COUNT(*) FROM reservations WHERE book_id = ? AND status = 'waiting' AND id <= ?",
+                                (reservation["book_id"], reservation["id"])).fetchone()[0]
+    return {"reservation_id": reservation["id"], "title": title, "status": reservation["status"], "position": position, "replayed": replayed}
+
+@tracing.traced("db.reserve", stage="db")
+def reserve(member_id: int, title: str, idempotency_key: str = None) -> dict:
+    """Reserves a book for a member and returns the outcome, or None if no such book exists.
+
+    A free copy is taken with a conditional decrement (`copies > 0`), so inventory can never go negative;
+    when none is left the member joins the book's hold queue. Retrying with the same `idempotency_key`,
+    or reserving a book the member already has open, returns the existing reservation (`replayed`).
+    Cancelling releases the key, so the same key books again afterwards.
+    """
+    conn = get_connection()
+    with _immediate(conn):
+        if idempotency_key:
+            existing = conn.execute("SELECT r.*, b.title FROM reservations r JOIN books b ON b.id = r.book_id "
+                                    "WHERE r.member_id = ? AND r.idempotency_key = ?", (member_id, idempotency_key)).fetchone()
+            if existing: return _outcome(conn, existing, existing["title"], replayed=True)
+        book = _find_book(conn, title)
+        if not book: return None
+        existing = conn.execute("SELECT * FROM reservations WHERE member_id = ? AND book_id = ? AND status IN ('held', 'waiting')",
+                                (member_id, book["id"])).fetchone()
+        if existing: return _outcome(conn, existing, book["title"], replayed=True)
+        took_copy = conn.execute("UPDATE books SET copies = copies - 1 WHERE id = ? AND copies > 0", (book["id"],)).rowcount == 1
+        cursor = conn.execute("INSERT INTO reservations (member_id, book_id, status, idempotency_key) VALUES (?, ?, ?, ?)",
+                              (member_id, book["id"], HELD if took_copy else WAITING, idempotency_key))
+        if took_copy: bump_catalog_version(conn)
+        reservation = conn.execute("SELECT * FROM reservations WHERE id = ?", (cursor.lastrowid,)).fetchone()
+        return _outcome(conn, reservation, book["title"], replayed=False)
+
+def fill_waiting(conn) -> int:
+    """Hands copies on the shelf to queued members, oldest reservation first, and returns how many were promoted.
+
+    For when copies arrive outside a cancellation (e.g. a catalog import); call it inside a write transaction.
+    """
+    promoted = 0
+    for book_id, copies in conn.execute("SELECT b.id, b.copies FROM books b WHERE b.copies > 0 AND b.id IN "
+                                        "(SELECT book_id FROM reservations WHERE status = 'waiting')").fetchall():
+        queue = [(row[0],) for row in conn.execute("SELECT id FROM reservations WHERE book_id = ? AND status = 'waiting' ORDER BY id LIMIT ?",
+                                                   (book_id, copies))]
+        conn.executemany("UPDATE reservations SET status = 'held', updated_at = CURRENT_TIMESTAMP WHERE id = ?", queue)
+        conn.execute("UPDATE books SET copies = copies - ? WHERE id = ?", (len(queue), book_id))
+        promoted += len(queue)
+    return promoted
+
+@tracing.traced("db.cancel_reservation", stage="db")
+def cancel(member_id: int, title: str) -> dict:
+    """Cancels a member's open reservation and returns {"title", "status", "promoted"}, or None if there is none.
+
+    A cancelled hold passes its copy to the first member in the queue; with an empty queue it returns to the shelf.
+    """
+    conn = get_connection()
+    with _immediate(conn):
+        book = _find_book(conn, title)
+        if not book: return None
+        reservation = conn.execute("SELECT * FROM reservations WHERE member_id = ? AND book_id = ? AND status IN ('held', 'waiting')",
+                                   (member_id, book["id"])).fetchone()
+        if not reservation: return None
+        conn.execute("UPDATE reservations SET status = 'cancelled', idempotency_key = NULL, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                     (reservation["id"],))
+        promoted = None
+        if reservation["status"] == HELD:
+            promoted = conn.execute("SELECT id, member_id FROM reservations WHERE book_id = ? AND status = 'waiting' ORDER BY id LIMIT 1",
+                                    (book["id"],)).fetchone()
+            if promoted:
+                conn.execute("UPDATE reservations SET status = 'held', updated_at = CURRENT_TIMESTAMP WHERE id = ?", (promoted["id"],))
+            else:
+                conn.execute("UPDATE books SET copies = copies + 1 WHERE id = ?", (book["id"],)); bump_catalog_version(conn)
+        return {"title": book["title"], "status": reservation["status"], "promoted": promoted["member_id"] if promoted else None}
@@ -0,0 +1,98 @@
+# assistant/response_cache.py
+
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from . import schema
+from .cache import TTLCache
+from .connection import get_connection
+from .history import to_dicts
+
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 2048))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 6 * 3600))
+ADMIN_ID = 0  # Seeded by setup_database.py; admins get different tools and answers.
+# Words that make a prompt refer back to the conversation ("yes", "the second one", "reserve it"). Only prompts
+# containing one are keyed on the model's previous reply; a false positive just costs a cache hit.
+FOLLOW_UP_WORDS = {
+    "yes", "yeah", "yep", "no", "nope", "ok", "okay", "sure", "please", "thanks", "it", "its", "that", "this", "those",
+    "these", "them", "they", "one", "ones", "first", "second", "third", "last", "next", "previous", "more", "another",
+    "other", "others", "same", "again", "also", "too", "instead", "else", "which", "about", "him", "her", "he", "she",
+}
+
+def normalize_prompt(text: str) -> str:
+    """Folds case, Unicode forms, punctuation and spacing, so "Who made you?" and "who made you" share an entry."""
+    return " ".join(re.findall(r"\w+", unicodedata.normalize("NFKC", text).casefold()))
+
+def is_follow_up(prompt: str) -> bool:
+    """True if the prompt's meaning may depend on what the model said before (see FOLLOW_UP_WORDS)."""
+    return not FOLLOW_UP_WORDS.isdisjoint(normalize_prompt(prompt).split())
+
+def _last_reply(history) -> str:
+    """Returns the model's previous text reply, which decides what short follow-ups like "yes" refer to."""
+    if not history: return ""
+    last = to_dicts(history[-1:])[0]
+    return " ".join(part["text"] for part in last["parts"] if "text" in part) if last["role"] == "model" else ""
+
+class ResponseCache:
+    """Replays whole chat turns for repeated prompts instead of asking the model again.
+
+    Entries are keyed by the normalized prompt, the language and the member's role; follow-ups like "yes" or
+    "the second one" are also keyed by the model's previous reply, which decides what they refer to.
+    Turns that read the catalog are stored with the catalog version they saw, and any later change to the catalog
+    (see `schema.bump_catalog_version`) retires them; other turns survive inventory changes.
+    Turns that depend on who is asking are stored under the member-scoped key, which also includes the member ID.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self._entries = TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stale": 0, "stored": 0, "bypassed": 0}
+
+    def _count(self, counter: str):
+        with self._lock: self.counters[counter] += 1
+
+    def keys(self, prompt: str, lang: str, member_id: int, history) -> tuple:
+        """Returns the (shared, member-scoped) cache keys for a prompt sent after `history`, plus the current catalog version."""
+        role = "admin" if member_id == ADMIN_ID else "member"
+        context = hashlib.sha256(normalize_prompt(_last_reply(history)).encode("utf-8")).hexdigest()[:16] if is_follow_up(prompt) else ""
+        shared = (normalize_prompt(prompt), lang, role, context)
+        return shared, shared + (member_id,), schema.catalog_version(get_connection())
+
+    def _current(self, key: tuple, version: int):
+        entry = self._entries.get(key)
+        if entry is None or entry["catalog_version"] in (None, version): return entry
+        self._count("stale")
+        return None
+
+    def get(self, keys: tuple):
+        """Returns a cached turn ({"text", "contents", "books"}) for either key, or None if absent or the catalog has changed."""
+        shared, member, version = keys
+        entry = self._current(member, version)
+        if entry is None: entry = self._current(shared, version)
+        self._count("misses" if entry is None else "hits")
+        return entry
+
+    def put(self, key: tuple, text: str, contents: list, books: list, catalog_version: int = None):
+        """Stores a finished turn: its reply, its history contents (tool exchanges included) and its book cards.
+
+        `catalog_version` is the version the turn's catalog reads saw, or None if the turn did not read the catalog.
+        """
+        self._entries.set(key, {"text": text, "contents": to_dicts(contents), "books": books, "catalog_version": catalog_version})
+        self._count("stored")
+
+    def bypass(self):
+        """Records a turn that was not stored, e.g. because it changed state."""
+        self._count("bypassed")
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Returns hit/miss/bypass counters and the hit rate, plus the underlying LRU's size and evictions."""
+        with self._lock: counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"]
+        entries = self._entries.stats()
+        return {**counters, "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+                "size": entries["size"], "maxsize": entries["maxsize"], "evictions": entries["evictions"], "expirations": entries["expirations"]}
@@ -0,0 +1,124 @@
+# assistant/schema.py
+
+# Triggers that keep `books_fts` in sync with `books`. Bulk loads drop them and rebuild the index once at the end.
+FTS_TRIGGERS = {
+    "books_fts_ai": """CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts (rowid, title, author, genre) VALUES (new.id, new.title, new.author, new.genre);
+    END""",
+    "books_fts_ad": """CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts (books_fts, rowid, title, author, genre) VALUES ('delete', old.id, old.title, old.author, old.genre);
+    END""",
+    "books_fts_au": """CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author, genre ON books BEGIN
+        INSERT INTO books_fts (books_fts, rowid, title, author, genre) VALUES ('delete', old.id, old.title, old.author, old.genre);
+        INSERT INTO books_fts (rowid, title, author, genre) VALUES (new.id, new.title, new.author, new.genre);
+    END""",
+}
+REBUILD_FTS = "INSERT INTO books_fts (books_fts) VALUES ('rebuild')"
+
+# Each migration is (version, statements). They run once, in order, and bump `PRAGMA user_version`,
+# so fresh databases from setup_database.py and older library.db files converge on the same schema.
+MIGRATIONS = [
+    (1, [  # Full-text index over the catalog, kept in sync with `books` by triggers.
+        """CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author, genre, content='books', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2'
+        )""",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS books_fts_vocab USING fts5vocab(books_fts, 'row')",
+        *FTS_TRIGGERS.values(),
+        REBUILD_FTS,
+    ]),
+    (2, [  # Persistent tier of the Google Books cover cache (previously created lazily by CoverCache).
+        "CREATE TABLE IF NOT EXISTS cover_cache (key TEXT PRIMARY KEY, url TEXT NOT NULL, expires_at REAL NOT NULL)",
+    ]),
+    (3, [  # Locally stored cover thumbnails; files whose book goes away are queued for garbage collection.
+        "ALTER TABLE books ADD COLUMN cover_path TEXT",
+        "CREATE TABLE IF NOT EXISTS cover_gc_queue (path TEXT PRIMARY KEY)",
+        """CREATE TRIGGER IF NOT EXISTS books_cover_gc_ad AFTER DELETE ON books WHEN old.cover_path IS NOT NULL BEGIN
+            INSERT OR IGNORE INTO cover_gc_queue (path) VALUES (old.cover_path);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS books_cover_gc_au AFTER UPDATE OF cover_path ON books
+        WHEN old.cover_path IS NOT NULL AND old.cover_path IS NOT new.cover_path BEGIN
+            INSERT OR IGNORE INTO cover_gc_queue (path) VALUES (old.cover_path);
+        END""",
+    ]),
+    (4, [  # Small key/value counters, starting with the catalog version the response cache is keyed on.
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('catalog_version', 0)",
+    ]),
+    (5, [  # Reservations: 'held' ones have a copy set aside, 'waiting' ones queue (by id) for the next copy.
+        """CREATE TABLE IF NOT EXISTS reservations (
+            id INTEGER PRIMARY KEY,
+            member_id INTEGER NOT NULL REFERENCES members (id),
+            book_id INTEGER NOT NULL REFERENCES books (id),
+            status TEXT NOT NULL CHECK (status IN ('held', 'waiting', 'cancelled')),
+            idempotency_key TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        "CREATE INDEX IF NOT EXISTS reservations_queue ON reservations (book_id, status, id)",
+        # At most one open reservation per member and book; a repeated click replays it instead of booking twice.
+        "CREATE UNIQUE INDEX IF NOT EXISTS reservations_open ON reservations (member_id, book_id) WHERE status IN ('held', 'waiting')",
+        "CREATE UNIQUE INDEX IF NOT EXISTS reservations_idempotency ON reservations (member_id, idempotency_key) WHERE idempotency_key IS NOT NULL",
+    ]),
+    (6, [  # Logins match names case-insensitively; without this, `lower(name) = ?` can only be checked row by row.
+        "CREATE INDEX IF NOT EXISTS members_lower_name ON members (lower(name))",
+    ]),
+    (7, [  # Lets the cover cache sweep expired rows without scanning the whole table.
+        "CREATE INDEX IF NOT EXISTS cover_cache_expiry ON cover_cache (expires_at)",
+    ]),
+    (8, [  # Cancelling now releases a reservation's idempotency key; release the keys of reservations cancelled before.
+        "UPDATE reservations SET idempotency_key = NULL WHERE status = 'cancelled' AND idempotency_key IS NOT NULL",
+    ]),
+    (9, [  # Searches put books whose whole title or author equals the query first, whatever the hit count.
+        "CREATE INDEX IF NOT EXISTS books_title_nocase ON books (title COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS books_author_nocase ON books (author COLLATE NOCASE)",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def restore_fts_sync(conn) -> bool:
+    """Recreates any missing full-text triggers and rebuilds the index; returns True if anything was missing.
+
+    A bulk load drops the triggers while it runs (see `importer.load_books`). If it is killed before restoring
+    them, the next connection to open puts them back, so later changes to `books` reach `books_fts` again.
+    """
+    present = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'books_fts_%'")}
+    if present >= set(FTS_TRIGGERS): return False
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for statement in FTS_TRIGGERS.values(): conn.execute(statement)
+        conn.execute(REBUILD_FTS)  # Rows written while the triggers were gone are not in the index yet.
+        conn.commit()
+    except Exception:
+        conn.rollback(); raise
+    return True
+
+def migrate(conn) -> int:
+    """Applies any pending migrations to an open connection and returns the resulting schema version.
+
+    Also restores the full-text triggers if an interrupted bulk load left them dropped.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        restore_fts_sync(conn)
+        return SCHEMA_VERSION
+    conn.execute("BEGIN IMMEDIATE")  # Re-check under the write lock in case another process migrated first.
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, statements in MIGRATIONS:
+            if target > version:
+                for statement in statements: conn.execute(statement)
+                version = target
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+    except Exception:
+        conn.rollback(); raise
+    restore_fts_sync(conn)
+    return version
+
+def catalog_version(conn) -> int:
+    """Returns the counter bumped by every change to the catalog (see `bump_catalog_version`)."""
+    return conn.execute("SELECT value FROM meta WHERE key = 'catalog_version'").fetchone()[0]
+
+def bump_catalog_version(conn):
+    """Marks the catalog as changed, so answers cached against the old catalog are no longer served."""
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'catalog_version'")
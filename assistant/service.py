@@ -0,0 +1,125 @@
+# assistant/service.py
+
+import asyncio
+import contextvars
+import copy
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from . import tracing
+
+# Blocking work runs on a few bounded pools, so a stalled cover lookup or gTTS call cannot starve logins.
+POOL_SIZES = {"db": int(os.environ.get("SERVICE_DB_WORKERS", 8)), "network": int(os.environ.get("SERVICE_NETWORK_WORKERS", 16)),
+              "tts": int(os.environ.get("SERVICE_TTS_WORKERS", 2))}
+MAX_PENDING_PER_WORKER = int(os.environ.get("SERVICE_MAX_PENDING_PER_WORKER", 4))  # Queued + running calls per worker.
+QUEUE_TIMEOUT = float(os.environ.get("SERVICE_QUEUE_TIMEOUT", 2.0))  # Seconds a call may wait for a free slot.
+CALL_TIMEOUT = float(os.environ.get("SERVICE_CALL_TIMEOUT", 60.0))
+
+class ServiceBusy(RuntimeError):
+    """Raised when a pool stays full for longer than QUEUE_TIMEOUT; the caller should degrade or try again later."""
+
+def _registry() -> dict:
+    """Maps each callable name to (function, pool, coalesce identical in-flight calls)."""
+    from . import database, speech, tools
+    return {
+        "search_books": (tools.search_books, "network", True),  # May wait for cover lookups.
+        "suggest_books_by_mood": (tools.suggest_books_by_mood, "network", True),
+        "get_my_details": (tools.get_my_details, "db", True),
+        "reserve_book": (tools.reserve_book, "db", False),
+        "cancel_reservation": (tools.cancel_reservation, "db", False),
+        "add_book": (tools.add_book, "db", False),
+        "add_member": (tools.add_member, "db", False),
+        "check_member_credentials": (database.check_member_credentials, "db", True),
+        "signup_member": (database.signup_member, "db", False),
+        "find_member_by_id": (database.find_member_by_id, "db", True),
+        "synthesize": (speech.synthesize, "tts", True),
+    }
+
+class ToolService:
+    """Runs tool, account and speech calls on an asyncio loop in a background thread.
+
+    Streamlit script threads only submit work and wait for its result. Blocking functions run on bounded
+    executor pools. Identical read-only calls already in flight share one execution, and once a pool has
+    `MAX_PENDING_PER_WORKER` calls per worker queued, new calls wait up to QUEUE_TIMEOUT and then fail
+    with ServiceBusy rather than piling up.
+    """
+
+    def __init__(self, pool_sizes: dict = None):
+        self.pool_sizes = dict(pool_sizes or POOL_SIZES)
+        self._loop = None
+        self._start_lock = threading.Lock()
+        self._functions = self._executors = self._slots = None
+        self._in_flight = {}  # coalescing key -> asyncio.Task, only touched on the loop thread
+        self.counters = {pool: {"calls": 0, "coalesced": 0, "rejected": 0, "in_flight": 0} for pool in self.pool_sizes}
+
+    def _start(self):
+        with self._start_lock:
+            if self._loop is not None: return
+            self._functions = _registry()
+            self._executors = {pool: ThreadPoolExecutor(size, thread_name_prefix=f"service-{pool}") for pool, size in self.pool_sizes.items()}
+            self._slots = {pool: asyncio.Semaphore(size * MAX_PENDING_PER_WORKER) for pool, size in self.pool_sizes.items()}
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="tool-service", daemon=True).start()
+            self._loop = loop
+
+    async def _execute(self, name: str, args: tuple, kwargs: dict, context):
+        func, pool, _ = self._functions[name]
+        counters = self.counters[pool]
+        try:
+            await asyncio.wait_for(self._slots[pool].acquire(), QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            counters["rejected"] += 1
+            raise ServiceBusy(f"The {pool} workers are busy; please try again in a moment.") from None
+        counters["in_flight"] += 1
+        try:
+            call = functools.partial(context.run, self._traced, name, func, args, kwargs)
+            return await self._loop.run_in_executor(self._executors[pool], call)
+        finally:
+            counters["in_flight"] -= 1; self._slots[pool].release()
+
+    @staticmethod
+    def _traced(name: str, func, args: tuple, kwargs: dict):
+        with tracing.span(f"tool.{name}", stage="tool"): return func(*args, **kwargs)
+
+    async def _dispatch(self, name: str, args: tuple, kwargs: dict, context):
+        if name not in self._functions: raise KeyError(f"Unknown service call '{name}'")
+        _, pool, coalesce = self._functions[name]
+        self.counters[pool]["calls"] += 1
+        key = (name, args, tuple(sorted(kwargs.items()))) if coalesce else None
+        try: hash(key)
+        except TypeError: key = None  # Unhashable arguments are simply not coalesced.
+        if key is not None and key in self._in_flight:
+            self.counters[pool]["coalesced"] += 1
+            return copy.deepcopy(await asyncio.shield(self._in_flight[key]))  # Callers may mutate their results.
+        task = asyncio.ensure_future(self._execute(name, args, kwargs, context))
+        if key is not None:
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await task
+
+    def submit(self, name: str, /, *args, **kwargs):
+        """Schedules a call and returns a concurrent.futures.Future; the caller's trace context goes with it."""
+        self._start()
+        return asyncio.run_coroutine_threadsafe(self._dispatch(name, args, kwargs, contextvars.copy_context()), self._loop)
+
+    def call(self, name: str, /, *args, **kwargs):
+        """Runs a call on the service and blocks the calling thread until it returns (or raises)."""
+        return self.submit(name, *args, **kwargs).result(CALL_TIMEOUT)
+
+    def stats(self) -> dict:
+        """Returns per-pool call, coalescing, rejection and in-flight counters."""
+        return {pool: {"workers": self.pool_sizes[pool], **counters} for pool, counters in self.counters.items()}
+
+_service = ToolService()
+
+# --- Thin client used by app.py and chat.py ---
+
+def call(name: str, /, *args, **kwargs):
+    return _service.call(name, *args, **kwargs)
+
+def submit(name: str, /, *args, **kwargs):
+    return _service.submit(name, *args, **kwargs)
+
+def stats() -> dict:
+    return _service.stats()
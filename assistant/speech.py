@@ -0,0 +1,94 @@
+# assistant/speech.py
+
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from . import tracing
+from .cache import TTLCache
+
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR") or os.path.join(os.path.dirname(__file__), '..', '.cache', 'tts')
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+TTS_MEMORY_ITEMS = int(os.environ.get("TTS_MEMORY_ITEMS", 64))
+
+_memory = TTLCache(maxsize=TTS_MEMORY_ITEMS, ttl=24 * 3600)
+_disk_lock = threading.Lock()
+_disk_bytes = None  # Running total of the on-disk store, computed on first write.
+_presynth_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tts-presynth")
+_in_flight = {}  # key -> Future, so a replay during pre-synthesis waits instead of synthesizing twice.
+_in_flight_lock = threading.Lock()
+counters = {"memory_hits": 0, "disk_hits": 0, "synthesized": 0, "evictions": 0}
+
+def audio_key(text: str, lang: str) -> str:
+    """Content address of a clip: identical text in the same language always maps to the same file."""
+    return hashlib.sha256(f"{lang}\0{text}".encode("utf-8")).hexdigest()
+
+def _path(key: str) -> str:
+    return os.path.join(TTS_CACHE_DIR, key[:2], key + ".mp3")
+
+@tracing.traced("tts.synthesize", stage="tts")
+def _synthesize(text: str, lang: str) -> bytes:
+    from gtts import gTTS  # Most sessions never press 🔊, so only pay for the import when one does.
+    mp3_fp = BytesIO()
+    gTTS(text=text, lang=lang, slow=False).write_to_fp(mp3_fp)
+    return mp3_fp.getvalue()
+
+def _store(key: str, audio: bytes):
+    """Writes a clip atomically, then evicts least recently played clips until the store fits its budget."""
+    global _disk_bytes
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f: f.write(audio)
+    os.replace(tmp_path, path)
+    with _disk_lock:
+        if _disk_bytes is None:
+            _disk_bytes = sum(entry.stat().st_size for entry in _scan())
+        else:
+            _disk_bytes += len(audio)
+        if _disk_bytes > TTS_CACHE_MAX_BYTES:
+            for entry in sorted(_scan(), key=lambda e: e.stat().st_mtime):  # mtime is bumped on every play.
+                if _disk_bytes <= TTS_CACHE_MAX_BYTES * 0.9: break
+                if entry.path == path: continue
+                _disk_bytes -= entry.stat().st_size
+                os.remove(entry.path); counters["evictions"] += 1
+
+def _scan():
+    for shard in os.scandir(TTS_CACHE_DIR):
+        if shard.is_dir():
+            yield from (entry for entry in os.scandir(shard.path) if entry.name.endswith(".mp3"))
+
+def _load(key: str, text: str, lang: str) -> bytes:
+    try:
+        with open(_path(key), "rb") as f: audio = f.read()
+        os.utime(_path(key))  # Mark as recently played for LRU eviction.
+        counters["disk_hits"] += 1
+    except FileNotFoundError:
+        audio = _synthesize(text, lang); counters["synthesized"] += 1
+        _store(key, audio)
+    _memory.set(key, audio)
+    return audio
+
+def synthesize(text: str, lang: str = "en") -> bytes:
+    """Returns MP3 bytes for `text`, from memory, then the on-disk store, and only then from gTTS."""
+    key = audio_key(text, lang)
+    audio = _memory.get(key)
+    if audio is not None:
+        counters["memory_hits"] += 1; return audio
+    with _in_flight_lock: pending = _in_flight.get(key)
+    return pending.result() if pending is not None else _load(key, text, lang)
+
+def presynthesize(text: str, lang: str = "en"):
+    """Synthesizes `text` in the background so the first 🔊 press is already a cache hit."""
+    key = audio_key(text, lang)
+    with _in_flight_lock:
+        if key in _in_flight or _memory.get(key) is not None: return
+        future = _in_flight[key] = _presynth_pool.submit(_load, key, text, lang)
+    def _done(_):
+        with _in_flight_lock: _in_flight.pop(key, None)
+    future.add_done_callback(_done)
+
+def stats() -> dict:
+    """Returns cache counters and the current size of the on-disk store."""
+    return {**counters, "memory_items": len(_memory), "disk_bytes": _disk_bytes}
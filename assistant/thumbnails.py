@@ -0,0 +1,120 @@
+# assistant/thumbnails.py
+
+import argparse
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+from . import http_client, tracing
+from .connection import get_connection
+
+THUMBNAIL_DIR = os.environ.get("THUMBNAIL_DIR") or os.path.join(os.path.dirname(__file__), '..', 'covers')
+CARD_SIZE = (128, 192)  # Every cover is cropped and scaled to the book card's size.
+PREFETCH_WORKERS = int(os.environ.get("THUMBNAIL_PREFETCH_WORKERS", 16))
+DOWNLOAD_TIMEOUT = 10
+
+_images = http_client.client("cover_images", pool_maxsize=PREFETCH_WORKERS, read_timeout=DOWNLOAD_TIMEOUT)
+
+_background = ThreadPoolExecutor(max_workers=4, thread_name_prefix="thumbnail")
+_pending = set()  # Book IDs with a background download in flight.
+_pending_lock = threading.Lock()
+
+def local_path(cover_path: str) -> str:
+    """Returns the on-disk location of a stored thumbnail, as referenced by `books.cover_path`."""
+    return os.path.join(THUMBNAIL_DIR, cover_path)
+
+def store_thumbnail(image_bytes: bytes) -> str:
+    """Resizes an image to the card size, stores it under its content hash and returns its `cover_path`."""
+    from PIL import Image, ImageOps
+    with Image.open(BytesIO(image_bytes)) as image:
+        card = ImageOps.fit(image.convert("RGB"), CARD_SIZE)
+    out = BytesIO(); card.save(out, format="JPEG", quality=85, optimize=True)
+    digest = hashlib.sha256(out.getvalue()).hexdigest()
+    cover_path = f"{digest[:2]}/{digest}.jpg"
+    path = local_path(cover_path)
+    if not os.path.exists(path):  # Identical covers (e.g. "image not available") are stored once.
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f: f.write(out.getvalue())
+        os.replace(tmp_path, path)
+    return cover_path
+
+@tracing.traced("http.thumbnail", stage="http")
+def download_cover(book_id: int, cover_url: str) -> str:
+    """Downloads a cover, stores its thumbnail and records it on the book; returns the `cover_path` or ""."""
+    if not cover_url: return ""
+    import requests
+    try:
+        response = _images.get(cover_url)
+        response.raise_for_status()
+        cover_path = store_thumbnail(response.content)
+    except http_client.CircuitOpenError:
+        return ""  # The image host is failing; the book keeps its placeholder until a later search queues it again.
+    except (requests.RequestException, OSError) as e:  # PIL raises OSError subclasses for unreadable images.
+        print(f"Error downloading cover for book {book_id}: {e}"); return ""
+    with get_connection() as conn: conn.execute("UPDATE books SET cover_path = ? WHERE id = ?", (cover_path, book_id))
+    return cover_path
+
+def download_in_background(covers: dict):
+    """Queues {book_id: cover_url} downloads without waiting, so the next render of these books is local."""
+    for book_id, cover_url in covers.items():
+        with _pending_lock:
+            if not cover_url or book_id in _pending: continue
+            _pending.add(book_id)
+        _background.submit(_download_and_release, book_id, cover_url)
+
+def _download_and_release(book_id: int, cover_url: str):
+    try: download_cover(book_id, cover_url)
+    finally:
+        with _pending_lock: _pending.discard(book_id)
+
+def collect_garbage(full: bool = False) -> int:
+    """Deletes thumbnails no book references any more and returns how many files were removed.
+
+    Normally only paths queued by the delete/update triggers are checked; `full` sweeps the whole directory.
+    """
+    conn = get_connection()
+    if full:
+        candidates = [f"{shard}/{name}" for shard in (os.listdir(THUMBNAIL_DIR) if os.path.isdir(THUMBNAIL_DIR) else [])
+                      for name in os.listdir(os.path.join(THUMBNAIL_DIR, shard)) if name.endswith(".jpg")]
+    else:
+        candidates = [row[0] for row in conn.execute("SELECT path FROM cover_gc_queue")]
+    referenced = {row[0] for row in conn.execute("SELECT DISTINCT cover_path FROM books WHERE cover_path IS NOT NULL")}
+    removed = 0
+    for cover_path in candidates:
+        if cover_path in referenced: continue
+        try: os.remove(local_path(cover_path)); removed += 1
+        except FileNotFoundError: pass
+    with conn: conn.executemany("DELETE FROM cover_gc_queue WHERE path = ?", [(path,) for path in candidates])
+    return removed
+
+def prefetch(workers: int = PREFETCH_WORKERS, progress=None) -> dict:
+    """Downloads thumbnails for every book that does not have one yet, `workers` at a time."""
+    from .tools import cover_cache, fetch_book_cover_url  # Resolves through the shared cover-URL cache.
+    books = get_connection().execute("SELECT id, title, author FROM books WHERE cover_path IS NULL").fetchall()
+    stats = {"books": len(books), "stored": 0, "missing": 0}
+    def fetch(book):
+        return download_cover(book["id"], fetch_book_cover_url(book["title"], book["author"]))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail-prefetch") as pool:
+        for done, future in enumerate(as_completed([pool.submit(fetch, book) for book in books]), 1):
+            stats["stored" if future.result() else "missing"] += 1
+            if progress: progress(done, len(books))
+    stats["garbage_collected"] = collect_garbage()
+    stats["expired_cover_urls"] = cover_cache.purge_expired()
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the local book cover thumbnail store.")
+    parser.add_argument("command", choices=["prefetch", "gc"], help="prefetch: warm the store for the whole catalog; gc: delete unreferenced files")
+    parser.add_argument("--workers", type=int, default=PREFETCH_WORKERS)
+    parser.add_argument("--full", action="store_true", help="gc: sweep the whole directory instead of the deletion queue")
+    args = parser.parse_args(argv)
+    if args.command == "gc":
+        print(f"Removed {collect_garbage(args.full)} unreferenced thumbnails."); return
+    stats = prefetch(args.workers, progress=lambda done, total: print(f"\r{done:,}/{total:,} books...", end="", flush=True))
+    print(f"\nStored {stats['stored']:,} thumbnails, {stats['missing']:,} books without a cover, "
+          f"removed {stats['garbage_collected']:,} unreferenced files.")
+
+if __name__ == "__main__":
+    main()
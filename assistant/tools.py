@@ -2,74 +2,222 @@
 
 import sqlite3
 import os
-import requests
+import re
+import difflib
+from concurrent.futures import ThreadPoolExecutor, wait
+from . import database, http_client, reservations, thumbnails, tracing
+from .connection import get_connection
+from .covers import CoverCache
+from .schema import bump_catalog_version
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'library.db')
 GOOGLE_BOOKS_API_URL = "https://www.googleapis.com/books/v1/volumes"
+COVER_FETCH_CONCURRENCY = int(os.environ.get("COVER_FETCH_CONCURRENCY", 8))
+COVER_FETCH_DEADLINE = float(os.environ.get("COVER_FETCH_DEADLINE", 2.0))  # Seconds a search waits for covers.
+SEARCH_PAGE_SIZE = 10
+SEARCH_CANDIDATES = int(os.environ.get("SEARCH_CANDIDATES", 2500))  # Title/author hits ranked per search; broader queries are cut off here.
+MIN_PREFIX_CHARS = 3  # A shorter last term is matched as a whole word only; "a*" would expand to half the vocabulary.
+SUGGESTION_COUNT = 5
 
 def _connect_db():
-    """Establishes a connection to the database."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Returns this thread's pooled connection to the database."""
+    return get_connection()
 
-def fetch_book_cover_url(title: str, author: str) -> str:
-    """Fetches a book cover URL from the Google Books API."""
+cover_cache = CoverCache(_connect_db)
+
+# One keep-alive session and worker pool shared by every search, so cover lookups reuse TCP/TLS connections.
+# Its breaker stops lookups during a Google Books outage; searches then show text-only results.
+_google_books = http_client.client("google_books", pool_maxsize=COVER_FETCH_CONCURRENCY, read_timeout=COVER_FETCH_DEADLINE)
+_cover_pool = ThreadPoolExecutor(max_workers=COVER_FETCH_CONCURRENCY, thread_name_prefix="cover-fetch")
+
+@tracing.traced("http.google_books", stage="http")
+def _request_cover_url(title: str, author: str) -> str:
+    """Asks the Google Books API for a cover URL; returns "" when it has none and raises on network errors."""
+    query = f"intitle:{title}+inauthor:{author}"
+    response = _google_books.get(GOOGLE_BOOKS_API_URL, params={"q": query, "maxResults": 1})
+    response.raise_for_status()
+    data = response.json()
+    if "items" in data:
+        volume_info = data["items"][0].get("volumeInfo", {})
+        image_links = volume_info.get("imageLinks", {})
+        return image_links.get("thumbnail", "")
+    return ""
+
+def _fetch_and_cache_cover_url(title: str, author: str) -> str:
+    """Fetches a cover URL from the network and records the outcome in the cover cache."""
+    import requests
     try:
-        query = f"intitle:{title}+inauthor:{author}"
-        response = requests.get(GOOGLE_BOOKS_API_URL, params={"q": query, "maxResults": 1})
-        response.raise_for_status()
-        data = response.json()
-        if "items" in data:
-            volume_info = data["items"][0].get("volumeInfo", {})
-            image_links = volume_info.get("imageLinks", {})
-            return image_links.get("thumbnail", "")
+        url = _request_cover_url(title, author)
+    except http_client.CircuitOpenError:
+        return ""  # Google Books is down; the outage was already reported when the breaker opened.
     except requests.RequestException as e:
         print(f"Error fetching book cover for '{title}': {e}")
-    return ""
+        return ""  # Transient failures are not cached, so the next search retries.
+    cover_cache.set(title, author, url)
+    return url
+
+def fetch_book_cover_url(title: str, author: str) -> str:
+    """Fetches a book cover URL, consulting the cover cache before the Google Books API."""
+    cached = cover_cache.get(title, author)
+    return cached if cached is not None else _fetch_and_cache_cover_url(title, author)
+
+def fetch_cover_urls(pairs, deadline: float = COVER_FETCH_DEADLINE) -> dict:
+    """Resolves cover URLs for many (title, author) pairs in parallel, giving up on stragglers after `deadline` seconds.
+
+    Pairs still in flight at the deadline come back as "" and are cached when their lookup finishes.
+    While the Google Books breaker is open, only cached covers are returned and nothing is looked up.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    covers = cover_cache.get_many(pairs)
+    if not _google_books.available(): return {pair: covers.get(pair, "") for pair in pairs}
+    futures = {tracing.submit(_cover_pool, _fetch_and_cache_cover_url, *pair): pair for pair in pairs if pair not in covers}
+    if futures:
+        done, _ = wait(futures, timeout=deadline)
+        for future, pair in futures.items():
+            covers[pair] = future.result() if future in done else ""
+    return covers
 
-def search_books(query: str) -> list:
-    """Searches the library catalog and returns a list of book details, including cover URLs."""
-    conn = _connect_db()
-    cursor = conn.cursor()
-    search_query = f"%{query}%"
-    cursor.execute("SELECT title, author, genre, copies FROM books WHERE title LIKE ? OR author LIKE ?", (search_query, search_query))
-    results = cursor.fetchall()
-    conn.close()
-    
+def _fts_match(terms: list, prefix_last: bool = False) -> str:
+    """Builds an FTS5 query that requires every term as a whole word, and optionally the last one as a prefix."""
+    phrases = ['"' + term.replace('"', '""') + '"' for term in terms]
+    if prefix_last: phrases[-1] += "*"
+    return " ".join(phrases)
+
+def _is_partial(cursor, term: str) -> bool:
+    """True if `term` is long enough to expand and is not a whole indexed word, like "quant" for "quantum"."""
+    return len(term) >= MIN_PREFIX_CHARS and not cursor.execute("SELECT 1 FROM books_fts WHERE books_fts MATCH ? LIMIT 1", (_fts_match([term]),)).fetchone()
+
+def _correct_terms(cursor, terms: list) -> list:
+    """Replaces terms missing from the index with the closest indexed word sharing their first two letters and similar length."""
+    corrected = []
+    for term in terms:
+        if len(term) < 3 or cursor.execute("SELECT 1 FROM books_fts_vocab WHERE term >= ? AND term < ? LIMIT 1", (term, term + "\uffff")).fetchone():
+            corrected.append(term); continue
+        candidates = [row[0] for row in cursor.execute("SELECT term FROM books_fts_vocab WHERE term >= ? AND term < ? AND length(term) BETWEEN ? AND ?",
+                                                       (term[:2], term[:2] + "\uffff", len(term) - 2, len(term) + 2))]
+        corrected.extend(difflib.get_close_matches(term, candidates, n=1, cutoff=0.7) or [term])
+    return corrected
+
+class SearchResults(list):
+    """A page of books, plus an optional `note` for the model (e.g. that a broad query was only partly ranked)."""
+    note = None
+
+def _exact_matches(cursor, query: str, limit: int) -> list:
+    """IDs of books whose whole title, then whole author, equals the query (ASCII case-insensitive)."""
+    return [row[0] for row in cursor.execute(
+        "SELECT id FROM (SELECT id, 0 AS kind FROM books WHERE title = ? COLLATE NOCASE "
+        "UNION ALL SELECT id, 1 FROM books WHERE author = ? COLLATE NOCASE ORDER BY kind, id LIMIT ?) GROUP BY id ORDER BY MIN(kind), id",
+        (query, query, limit))]
+
+def _ranked_search(cursor, terms: list, limit: int, offset: int, query: str = "") -> tuple:
+    """Returns (page of book rows, whether the ranking was cut off at SEARCH_CANDIDATES).
+
+    Order: exact title/author matches, then title/author hits by bm25 (title weighs most), then hits found only in
+    the genre. Scoring every hit of a broad term ("the") is what costs time on a big catalog, so when more than
+    SEARCH_CANDIDATES books match in titles and authors, only the first SEARCH_CANDIDATES of them are scored
+    and paging stops there; exact matches are always included.
+    """
+    match = _fts_match(terms, prefix_last=_is_partial(cursor, terms[-1]))
+    scored_match, need = "{title author} : (" + match + ")", offset + limit
+    scored = cursor.execute("SELECT COUNT(*) FROM (SELECT 1 FROM books_fts WHERE books_fts MATCH ? LIMIT ?)",
+                            (scored_match, SEARCH_CANDIDATES + 1)).fetchone()[0]
+    truncated = scored > SEARCH_CANDIDATES
+    ranked = _exact_matches(cursor, query.strip(), need) if query.strip() else []
+    exact = set(ranked)
+    ranking = ("SELECT rowid FROM books_fts WHERE books_fts MATCH ? ORDER BY bm25(books_fts, 10.0, 5.0, 1.0) LIMIT ?" if not truncated else
+               "SELECT rowid FROM (SELECT rowid, bm25(books_fts, 10.0, 5.0, 1.0) AS score FROM books_fts WHERE books_fts MATCH ? LIMIT "
+               + str(SEARCH_CANDIDATES) + ") ORDER BY score LIMIT ?")
+    ranked += [row[0] for row in cursor.execute(ranking, (scored_match, need + len(exact))) if row[0] not in exact]
+    page = ranked[offset:need]
+    if len(ranked) < need and not truncated:  # Every title/author hit is listed; genre-only hits follow in catalog order.
+        page += [row[0] for row in cursor.execute("SELECT rowid FROM books_fts WHERE books_fts MATCH ? ORDER BY rowid LIMIT ? OFFSET ?",
+                                                  ("(" + match + ") NOT " + scored_match, need - max(offset, len(ranked)), max(0, offset - len(ranked))))]
+    rows = {row["id"]: row for row in cursor.execute(
+        f"SELECT id, title, author, genre, copies, cover_path FROM books WHERE id IN ({','.join('?' * len(page))})", page)} if page else {}
+    return [rows[book_id] for book_id in page if book_id in rows], truncated
+
+def search_books(query: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0) -> list:
+    """Searches the library catalog by title, author or genre and returns a ranked page of book details, including cover URLs."""
+    terms = [term.casefold() for term in re.findall(r"\w+", query)]
+    results, truncated = [], False
+    if terms:
+        with tracing.span("db.search_books", stage="db"):
+            cursor = _connect_db().cursor()
+            limit, offset = max(1, int(limit)), max(0, int(offset))  # Gemini passes numbers as floats.
+            results, truncated = _ranked_search(cursor, terms, limit, offset, query)
+            if not results and offset == 0:
+                corrected = _correct_terms(cursor, terms)
+                if corrected != terms: results, truncated = _ranked_search(cursor, corrected, limit, offset)
+    note = (f"More than {SEARCH_CANDIDATES} books match this query, so only the first {SEARCH_CANDIDATES} were ranked and later pages stop there. "
+            "Ask the member for a more specific title or author to find others.") if truncated else None
     if not results:
-        return "No books were found in our catalog matching that query. You could ask me for a creative recommendation instead!"
+        return note or "No books were found in our catalog matching that query. You could ask me for a creative recommendation instead!"
+    page = SearchResults(_with_covers([dict(row) for row in results]))
+    page.note = note
+    return page
 
-    books = []
-    for row in results:
-        book_dict = dict(row)
-        book_dict["cover_url"] = fetch_book_cover_url(book_dict["title"], book_dict["author"])
-        books.append(book_dict)
+def _with_covers(books: list) -> list:
+    """Adds cover URLs to catalog rows, queues missing thumbnails and drops the internal book IDs."""
+    covers = fetch_cover_urls((book["title"], book["author"]) for book in books)
+    missing_thumbnails = {}
+    for book in books:
+        book["cover_url"] = covers[(book["title"], book["author"])]
+        if not book["cover_path"]:
+            del book["cover_path"]; missing_thumbnails[book["id"]] = book["cover_url"]
+        del book["id"]
+    thumbnails.download_in_background(missing_thumbnails)  # The next search shows these from local files.
     return books
 
-def reserve_book(member_id: int, title: str) -> str:
-    """Reserves a book for a member."""
-    return f"Success! A reservation for '{title}' has been placed for you. You'll be notified when it's ready for pickup."
+def suggest_books_by_mood(mood: str, limit: int = SUGGESTION_COUNT) -> list:
+    """Recommends in-stock books from our catalog whose title, author or genre best match a mood or genre."""
+    from . import vector_index  # NumPy is only loaded once someone asks for a recommendation.
+    books = vector_index.get_index().query(mood, max(1, int(limit)))
+    if not books:
+        return "No books in stock matched that mood. You could suggest some well-known titles instead, saying they are not in our catalog."
+    return _with_covers(books)
+
+def reserve_book(member_id: int, title: str, idempotency_key: str = None) -> str:
+    """Reserves a book for a member, holding a copy if one is free and queueing them otherwise."""
+    outcome = reservations.reserve(member_id, title, idempotency_key)
+    if outcome is None: return f"Error: There is no book titled '{title}' in our catalog."
+    title = outcome["title"]
+    if outcome["status"] == reservations.HELD:
+        if outcome["replayed"]: return f"You already have a copy of '{title}' on hold."
+        return f"Success! A copy of '{title}' is now on hold for you. You'll be notified when it's ready for pickup."
+    if outcome["status"] == reservations.WAITING:
+        if outcome["replayed"]: return f"You are already number {outcome['position']} on the waiting list for '{title}'."
+        return (f"All copies of '{title}' are reserved, so you've been added to the waiting list at position {outcome['position']}. "
+                "We'll hold a copy for you when one is returned.")
+    return f"Your reservation for '{title}' was already cancelled."
+
+def cancel_reservation(member_id: int, title: str) -> str:
+    """Cancels a member's reservation; a held copy goes to the next member in the queue."""
+    outcome = reservations.cancel(member_id, title)
+    if outcome is None: return f"Error: You have no open reservation for '{title}'."
+    return f"Your reservation for '{outcome['title']}' has been cancelled."
 
+@tracing.traced("db.add_book", stage="db")
 def add_book(title: str, author: str, genre: str, copies: int) -> str:
     """Adds a new book to the library catalog."""
-    conn = _connect_db(); cursor = conn.cursor()
     try:
-        cursor.execute("INSERT INTO books (title, author, genre, copies) VALUES (?, ?, ?, ?)", (title, author, genre, copies)); conn.commit()
-        return f"Successfully added '{title}' to the catalog."
+        with _connect_db() as conn:
+            cursor = conn.execute("INSERT INTO books (title, author, genre, copies) VALUES (?, ?, ?, ?)", (title, author, genre, copies))
+            bump_catalog_version(conn)
     except sqlite3.IntegrityError: return f"Error: A book with the title '{title}' already exists."
-    finally: conn.close()
+    from . import vector_index
+    try: vector_index.get_index().add(cursor.lastrowid, title, author, genre)
+    except (OSError, ValueError) as e: print(f"Error updating the recommendation index for '{title}': {e}")  # Fixed by the next rebuild.
+    return f"Successfully added '{title}' to the catalog."
 
+@tracing.traced("db.add_member", stage="db")
 def add_member(name: str, email: str) -> str:
     """Adds a new member to the library."""
-    conn = _connect_db(); cursor = conn.cursor()
     try:
-        cursor.execute("INSERT INTO members (name, email) VALUES (?, ?)", (name, email)); conn.commit()
+        with _connect_db() as conn: cursor = conn.execute("INSERT INTO members (name, email) VALUES (?, ?)", (name, email))
+        database.invalidate_member(cursor.lastrowid)
         return f"Successfully added new member '{name}' with Member ID: {cursor.lastrowid}."
     except sqlite3.IntegrityError: return f"Error: A member with the email '{email}' already exists."
-    finally: conn.close()
 
+@tracing.traced("db.get_my_details", stage="db")
 def get_my_details(member_id: int):
     """Gets details for the logged-in member."""
-    conn = _connect_db(); cursor = conn.cursor(); cursor.execute("SELECT * FROM members WHERE id = ?", (member_id,)); member = cursor.fetchone(); conn.close()
-    return dict(member) if member else None
\ No newline at end of file
+    return database.find_member_by_id(member_id)  # Usually answered by the member cache that login filled.
\ No newline at end of file
@@ -0,0 +1,169 @@
+# assistant/tracing.py
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from logging.handlers import RotatingFileHandler
+
+TRACE_FILE = os.environ.get("TRACE_FILE") or os.path.join(os.path.dirname(__file__), '..', '.cache', 'traces', 'trace.jsonl')
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", 5 * 1024 * 1024))
+TRACE_BACKUPS = 3
+STAGES = ["gemini", "tool", "db", "http", "tts"]
+
+_enabled = os.environ.get("TRACE_ENABLED", "").lower() in ("1", "true", "yes")
+_current = contextvars.ContextVar("current_span", default=None)
+_logger = logging.getLogger("assistant.trace")
+_logger.propagate = False
+_logger_lock = threading.Lock()
+
+def _ensure_handler():
+    with _logger_lock:
+        if not _logger.handlers:
+            os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+            handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _logger.addHandler(handler); _logger.setLevel(logging.INFO)
+
+def enabled() -> bool:
+    return _enabled
+
+def set_enabled(on: bool):
+    """Turns tracing on or off for the whole process."""
+    global _enabled
+    if on: _ensure_handler()
+    _enabled = on
+
+class _NoopSpan:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def set(self, **attrs): pass
+
+_NOOP = _NoopSpan()
+
+class Span:
+    """Times a block and writes it as one JSON line; nested spans share their root's trace_id."""
+
+    def __init__(self, name: str, stage: str = None, **attrs):
+        self.name, self.stage, self.attrs = name, stage, attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = uuid.uuid4().hex[:8]
+        self._token = _current.set(self)
+        self.start, self._started = time.time(), time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self._started) * 1000
+        _current.reset(self._token)
+        record = {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name,
+                  "stage": self.stage, "start": round(self.start, 6), "duration_ms": round(duration_ms, 3)}
+        if self.attrs: record["attrs"] = self.attrs
+        if exc_type: record["error"] = f"{exc_type.__name__}: {exc}"
+        _ensure_handler(); _logger.info(json.dumps(record, default=str))
+        return False
+
+def span(name: str, stage: str = None, **attrs):
+    """Returns a context manager timing a block, or a shared no-op when tracing is off."""
+    return Span(name, stage, **attrs) if _enabled else _NOOP
+
+def traced(name: str, stage: str = None):
+    """Decorator form of `span`; costs a single flag check per call while tracing is off."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled: return func(*args, **kwargs)
+            with Span(name, stage): return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def submit(pool, func, *args):
+    """Submits work to an executor so spans it opens stay attached to the caller's trace."""
+    return pool.submit(contextvars.copy_context().run, func, *args)
+
+# --- Reading traces back for the admin dashboard ---
+
+def _read_tail(max_bytes: int = 4 * 1024 * 1024) -> list:
+    if not os.path.exists(TRACE_FILE): return []
+    with open(TRACE_FILE, "rb") as f:
+        offset = max(0, os.path.getsize(TRACE_FILE) - max_bytes)
+        f.seek(offset)
+        lines = f.read().decode("utf-8", errors="ignore").splitlines()
+    records = []
+    for line in lines[1:] if offset else lines:  # After a seek the first line may be cut in half.
+        try: records.append(json.loads(line))
+        except ValueError: continue
+    return records
+
+def _merged(records: list) -> list:
+    """Merges the spans' [start, end) intervals (in ms), so nested and parallel spans count their wall time once."""
+    merged = []
+    for start, end in sorted((r["start"] * 1000, r["start"] * 1000 + r["duration_ms"]) for r in records):
+        if merged and start <= merged[-1][1]: merged[-1][1] = max(merged[-1][1], end)
+        else: merged.append([start, end])
+    return merged
+
+def _overlap(a: list, b: list) -> float:
+    """Total length of the intersection of two merged interval lists."""
+    total, i, j = 0.0, 0, 0
+    while i < len(a) and j < len(b):
+        total += max(0.0, min(a[i][1], b[j][1]) - max(a[i][0], b[j][0]))
+        if a[i][1] < b[j][1]: i += 1
+        else: j += 1
+    return total
+
+def _breakdown(records: list) -> dict:
+    """Returns wall time per stage within one turn.
+
+    A stage's spans are merged first, so a `db` span inside another `db` span, or cover lookups running in
+    parallel, are not added up. `tool` time excludes the other stages' spans nested in the tool call.
+    """
+    merged = {stage: _merged([r for r in records if r["stage"] == stage]) for stage in STAGES}
+    times = {stage: sum(end - start for start, end in intervals) for stage, intervals in merged.items()}
+    others = _merged([r for r in records if r["stage"] in STAGES and r["stage"] != "tool"])
+    times["tool"] -= _overlap(merged["tool"], others)
+    return {f"{stage}_ms": round(max(0.0, ms), 1) for stage, ms in times.items()}
+
+_turns_cache = (None, [])  # (trace file mtime, size and limit; turns), replaced as a whole.
+
+def recent_turns(limit: int = 50) -> list:
+    """Returns the last `limit` chat turns as {"start", "total_ms", <stage>_ms...} breakdowns, newest first.
+
+    The result is reused until the trace file changes, so dashboard reruns do not re-parse it.
+    """
+    global _turns_cache
+    try: stat = os.stat(TRACE_FILE); key = (stat.st_mtime_ns, stat.st_size, limit)
+    except FileNotFoundError: return []
+    cached_key, cached_turns = _turns_cache
+    if cached_key == key: return cached_turns
+    by_trace, roots = {}, []
+    for record in _read_tail():
+        by_trace.setdefault(record["trace_id"], []).append(record)
+        if record["stage"] == "turn": roots.append(record)
+    turns = []
+    for root in roots[-limit:][::-1]:
+        row = {"start": time.strftime("%H:%M:%S", time.localtime(root["start"])), "total_ms": root["duration_ms"]}
+        row.update(_breakdown(by_trace[root["trace_id"]]))
+        turns.append(row)
+    _turns_cache = key, turns
+    return turns
+
+def stage_percentiles(turns: list) -> list:
+    """Returns p50/p95 per stage (and for the whole turn) across `turns`."""
+    rows = []
+    for column in ["total_ms"] + [f"{stage}_ms" for stage in STAGES]:
+        values = sorted(turn[column] for turn in turns)
+        if not values: continue
+        pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+        rows.append({"stage": column[:-3], "p50_ms": pick(0.50), "p95_ms": pick(0.95)})
+    return rows
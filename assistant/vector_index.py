@@ -0,0 +1,242 @@
+# assistant/vector_index.py
+
+import functools
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from array import array
+import numpy as np
+from . import connection, tracing
+
+VECTOR_DIM = int(os.environ.get("VECTOR_DIM", 256))  # Hashed feature space; 256 float32s = 1 KiB per book.
+BUILD_CHUNK = 20000
+COMPACT_EVERY = 1000  # Added books journaled before the word counts are rewritten into the metadata file.
+GENRE_WEIGHT = 2.0  # A book's genre says more about its mood than any single title word.
+# Moods the assistant is asked about, expanded into words that appear in our titles and genres.
+MOOD_WORDS = {
+    "adventurous": "adventure quest voyage journey fantasy travel", "curious": "science history universe physics mind",
+    "cozy": "mystery romance cooking garden home", "dark": "mystery thriller horror shadow crime midnight",
+    "romantic": "romance love letters heart", "thoughtful": "philosophy mind history biography memory",
+    "happy": "comedy humor romance travel", "sad": "poetry memory letters loss", "scared": "horror thriller dark",
+    "inspired": "biography art poetry", "nostalgic": "history memory letters forgotten", "futuristic": "science fiction space quantum machine code",
+}
+
+_WORD = re.compile(r"\w+")
+
+def _tokens(text: str) -> list:
+    return [token for token in _WORD.findall((text or "").casefold()) if not token.isdigit()]  # "Volume 2" says nothing about mood.
+
+_feature_cache = {}
+
+def _feature(token: str) -> tuple:
+    """Maps a token to a stable (column, sign) pair; signed hashing keeps collisions from adding up."""
+    feature = _feature_cache.get(token)
+    if feature is None:
+        h = zlib.crc32(token.encode("utf-8"))
+        feature = _feature_cache[token] = (h % VECTOR_DIM, 1.0 if h & 0x80000000 else -1.0)
+    return feature
+
+@functools.lru_cache(maxsize=65536)
+def _shared_tokens(text: str) -> tuple:
+    """Tokens of a value many books share (authors, genres), computed once."""
+    return tuple(_tokens(text))
+
+def _term_counts(title: str, author: str, genre: str) -> dict:
+    counts = {}
+    for tokens in (_tokens(title), _shared_tokens(author or "")):
+        for token in tokens: counts[token] = counts.get(token, 0.0) + 1.0
+    for token in _shared_tokens(genre or ""): counts[token] = counts.get(token, 0.0) + GENRE_WEIGHT
+    return counts
+
+class _Vocabulary(dict):
+    """Numbers words in the order they are first seen."""
+    def __missing__(self, token: str) -> int:
+        number = self[token] = len(self)
+        return number
+
+def index_paths(db_path: str) -> tuple:
+    """Returns the (vectors, ids, metadata, journal) file paths of the index kept next to a database."""
+    base = os.path.splitext(os.path.abspath(db_path))[0] + ".vectors"
+    return base + ".npy", base + ".ids.npy", base + ".json", base + ".log"
+
+class VectorIndex:
+    """Hashed TF-IDF vectors for every book, persisted as memory-mapped arrays next to library.db.
+
+    Files: `<db>.vectors.npy` (rows x VECTOR_DIM float32, L2-normalized), `<db>.vectors.ids.npy` (book IDs),
+    `<db>.vectors.json` (row count and per-word document frequencies) and `<db>.vectors.log`, which journals
+    the words of each book added since the metadata was last written. Rows beyond `count` are spare capacity.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = os.path.abspath(db_path)
+        self.vectors_path, self.ids_path, self.meta_path, self.journal_path = index_paths(db_path)
+        self._lock = threading.RLock()
+        self._loaded_mtime, self._journal_offset, self._meta_count = None, 0, 0
+        self.vectors = self.ids = None
+        self.count, self.n_docs, self.df = 0, 0, {}
+
+    # --- Vectorizing ---
+
+    def _vectorize(self, counts_list: list) -> np.ndarray:
+        """Returns L2-normalized TF-IDF rows; words the catalog has never seen are left out."""
+        matrix = np.zeros((len(counts_list), VECTOR_DIM), dtype=np.float32)
+        n_docs, df = self.n_docs, self.df
+        for row, counts in enumerate(counts_list):
+            for token, count in counts.items():
+                if token not in df: continue
+                column, sign = _feature(token)
+                matrix[row, column] += sign * math.log1p(count) * (math.log((1.0 + n_docs) / (1.0 + df[token])) + 1.0)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def _count_document(self, counts: dict):
+        for token in counts: self.df[token] = self.df.get(token, 0) + 1
+        self.n_docs += 1
+
+    # --- Persistence ---
+
+    def _write_meta(self):
+        """Writes the full word counts and empties the journal; a crash in between is harmless (see `_replay`)."""
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dim": VECTOR_DIM, "count": self.count, "n_docs": self.n_docs, "df": self.df}, f)
+        os.replace(tmp_path, self.meta_path)
+        with open(self.journal_path, "w"): pass
+        self._loaded_mtime, self._journal_offset, self._meta_count = os.stat(self.meta_path).st_mtime_ns, 0, self.count
+
+    def _journal(self, row: int, counts: dict):
+        with open(self.journal_path, "a", encoding="utf-8") as f: f.write(json.dumps([row, list(counts)]) + "\n")
+        self._journal_offset = os.path.getsize(self.journal_path)
+
+    def _replay(self):
+        """Applies journal entries written since the last load; rows the metadata already counts are skipped."""
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(self._journal_offset); lines = f.read()
+        except FileNotFoundError: return
+        complete = lines[:lines.rfind(b"\n") + 1]  # A half-written last line is read once it is finished.
+        self._journal_offset += len(complete)
+        for line in complete.splitlines():
+            row, words = json.loads(line)
+            if row < self._meta_count or row < self.count: continue
+            self._count_document(words); self.count = row + 1
+
+    def _load(self) -> bool:
+        try: mtime = os.stat(self.meta_path).st_mtime_ns
+        except FileNotFoundError: return False
+        reloaded = mtime != self._loaded_mtime  # Another process rebuilt the index or compacted its journal.
+        if reloaded:
+            with open(self.meta_path) as f: meta = json.load(f)
+            if meta["dim"] != VECTOR_DIM: return False
+            self.count, self.n_docs, self.df = meta["count"], meta["n_docs"], meta["df"]
+            self._loaded_mtime, self._journal_offset, self._meta_count = mtime, 0, meta["count"]
+        self._replay()
+        if reloaded or self.vectors is None or len(self.ids) < self.count:
+            self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+            self.ids = np.load(self.ids_path, mmap_mode="r+")
+        return True
+
+    def _allocate(self, capacity: int, keep: int = 0):
+        """(Re)creates the memory-mapped files with room for `capacity` rows, keeping the first `keep` rows."""
+        vectors = np.lib.format.open_memmap(self.vectors_path + ".tmp", mode="w+", dtype=np.float32, shape=(capacity, VECTOR_DIM))
+        ids = np.lib.format.open_memmap(self.ids_path + ".tmp", mode="w+", dtype=np.int64, shape=(capacity,))
+        if keep: vectors[:keep], ids[:keep] = self.vectors[:keep], self.ids[:keep]
+        vectors.flush(); ids.flush(); del vectors, ids
+        os.replace(self.vectors_path + ".tmp", self.vectors_path); os.replace(self.ids_path + ".tmp", self.ids_path)
+        self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+        self.ids = np.load(self.ids_path, mmap_mode="r+")
+
+    # --- Building and updating ---
+
+    def rebuild(self) -> int:
+        """Re-indexes the whole catalog and returns the number of books indexed.
+
+        Each book is tokenized once into flat (word ID, count) arrays; document frequencies and the TF-IDF rows
+        are then computed with NumPy, BUILD_CHUNK books at a time.
+        """
+        conn = connection.get_connection(self.db_path)
+        with self._lock:
+            vocab, terms, counts, lengths, ids = _Vocabulary(), array("i"), array("f"), array("i"), array("q")
+            for book_id, title, author, genre in conn.execute("SELECT id, title, author, genre FROM books ORDER BY id"):
+                book = _term_counts(title, author, genre)
+                terms.extend(map(vocab.__getitem__, book)); counts.extend(book.values())
+                lengths.append(len(book)); ids.append(book_id)
+            terms, counts, lengths = np.frombuffer(terms, np.int32), np.frombuffer(counts, np.float32), np.frombuffer(lengths, np.int32)
+            df = np.bincount(terms, minlength=len(vocab))  # Each word appears once per book in `terms`.
+            self.n_docs, self.df = len(ids), dict(zip(vocab, df.tolist()))
+            features = [_feature(token) for token in vocab]
+            columns = np.array([column for column, _ in features], dtype=np.int64)
+            weights = np.array([sign for _, sign in features]) * (np.log((1.0 + self.n_docs) / (1.0 + df)) + 1.0)
+            self._allocate(max(1024, self.n_docs * 5 // 4))
+            self.ids[:self.n_docs] = np.frombuffer(ids, np.int64)
+            offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+            for start in range(0, self.n_docs, BUILD_CHUNK):
+                end = min(start + BUILD_CHUNK, self.n_docs)
+                chunk = slice(offsets[start], offsets[end])
+                rows = np.repeat(np.arange(end - start, dtype=np.int64), lengths[start:end])
+                values = weights[terms[chunk]] * np.log1p(counts[chunk])
+                matrix = np.bincount(rows * VECTOR_DIM + columns[terms[chunk]], values, minlength=(end - start) * VECTOR_DIM)
+                matrix = matrix.reshape(end - start, VECTOR_DIM)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                self.vectors[start:end] = matrix / np.where(norms == 0, 1.0, norms)
+            self.count = self.n_docs
+            self.vectors.flush(); self.ids.flush(); self._write_meta()
+            return self.count
+
+    def add(self, book_id: int, title: str, author: str, genre: str):
+        """Appends one book, growing the files geometrically when they are full.
+
+        Its words go to the journal; the full word counts are only rewritten every COMPACT_EVERY books.
+        """
+        with self._lock:
+            if not self._load(): self.rebuild(); return  # The new book is already in the table.
+            counts = _term_counts(title, author, genre)
+            self._count_document(counts)
+            if self.count >= len(self.ids): self._allocate(len(self.ids) * 2, keep=self.count)
+            self.vectors[self.count] = self._vectorize([counts])[0]
+            self.ids[self.count] = book_id
+            self.vectors.flush(); self.ids.flush()
+            self._journal(self.count, counts)
+            self.count += 1
+            if self.count - self._meta_count >= COMPACT_EVERY: self._write_meta()
+
+    # --- Querying ---
+
+    @tracing.traced("vector_index.query", stage="db")
+    def query(self, text: str, k: int = 5, in_stock: bool = True) -> list:
+        """Returns up to `k` books most similar to `text` by cosine similarity, best first."""
+        with self._lock:
+            if not self._load(): self.rebuild()
+            vectors, ids, count = self.vectors[:self.count], self.ids[:self.count], self.count
+            counts = {}
+            for token in _tokens(text):
+                counts[token] = counts.get(token, 0.0) + 1.0
+                for word in _tokens(MOOD_WORDS.get(token, "")): counts[word] = counts.get(word, 0.0) + 0.5  # The user's own words count most.
+            query = self._vectorize([counts])[0]
+        if not count or not query.any(): return []
+        scores = vectors @ query  # One matrix-vector product over the whole catalog.
+        conn = connection.get_connection(self.db_path)
+        for pool in (k * 5, k * 50):  # Widen the candidate pool if too many top hits are checked out.
+            top = np.argpartition(-scores, min(pool, count) - 1)[:pool]
+            top = top[np.argsort(-scores[top])]
+            top = top[scores[top] > 0]
+            candidate_ids = [int(book_id) for book_id in ids[top]]
+            rows = {row["id"]: row for row in conn.execute(
+                f"SELECT id, title, author, genre, copies, cover_path FROM books WHERE id IN ({','.join('?' * len(candidate_ids))})"
+                + (" AND copies > 0" if in_stock else ""), candidate_ids)} if candidate_ids else {}
+            books = [dict(rows[book_id]) for book_id in candidate_ids if book_id in rows][:k]
+            if len(books) >= k or len(top) < pool: return books
+        return books
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(db_path: str = None) -> VectorIndex:
+    """Returns the shared index for the library database (default: connection.DB_PATH)."""
+    db_path = os.path.abspath(db_path or connection.DB_PATH)
+    with _indexes_lock:
+        if db_path not in _indexes: _indexes[db_path] = VectorIndex(db_path)
+        return _indexes[db_path]
@@ -0,0 +1,58 @@
+# assistant/warmup.py
+
+import argparse
+import importlib
+import threading
+import time
+from . import service
+from .connection import get_connection
+
+_started = False
+_started_lock = threading.Lock()
+last_run = {}  # step -> milliseconds, from the most recent warm-up in this process
+
+def _step(name: str, func):
+    started = time.perf_counter()
+    try: func()
+    except Exception as e: print(f"Warm-up step '{name}' failed: {e}")
+    last_run[name] = round((time.perf_counter() - started) * 1000, 1)
+
+def _prime_index():
+    from . import vector_index
+    vector_index.get_index().query("warm up", 1)  # Maps the vectors (or builds them on a fresh catalog).
+
+def _prime_model():
+    from .model import load_model
+    load_model()
+
+def warm_up(model: bool = True, speech: bool = True) -> dict:
+    """Does the first-request work ahead of time and returns how long each step took, in milliseconds.
+
+    Opens (and migrates) the database connection, pages in the full-text index, maps the recommendation index,
+    starts the tool service, and optionally imports gTTS and builds the Gemini model with its tool schemas.
+    """
+    _step("database", lambda: get_connection().execute("SELECT COUNT(*) FROM members").fetchone())
+    _step("search_index", lambda: get_connection().execute("SELECT rowid FROM books_fts WHERE books_fts MATCH 'a*' LIMIT 1").fetchall())
+    _step("vector_index", _prime_index)
+    _step("tool_service", lambda: service.call("find_member_by_id", 0))
+    if speech: _step("gtts", lambda: importlib.import_module("gtts"))
+    if model: _step("model", _prime_model)
+    return dict(last_run)
+
+def warm_up_in_background(model: bool = True, speech: bool = True):
+    """Starts `warm_up` on a daemon thread the first time it is called in a process; later calls do nothing."""
+    global _started
+    with _started_lock:
+        if _started: return
+        _started = True
+    threading.Thread(target=warm_up, args=(model, speech), name="warm-up", daemon=True).start()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prime the library assistant's caches and report how long each step takes.")
+    parser.add_argument("--no-model", action="store_true", help="Skip building the Gemini model")
+    parser.add_argument("--no-speech", action="store_true", help="Skip importing gTTS")
+    args = parser.parse_args(argv)
+    for name, ms in warm_up(model=not args.no_model, speech=not args.no_speech).items(): print(f"{name:<14} {ms:>9.1f} ms")
+
+if __name__ == "__main__":
+    main()
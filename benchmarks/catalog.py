@@ -0,0 +1,51 @@
+# benchmarks/catalog.py
+
+import contextlib
+import io
+import random
+import sqlite3
+from assistant.importer import load_books
+from setup_database import setup_database
+
+FIRST_NAMES = ["James", "Mary", "Ahmed", "Fatima", "Wei", "Yuki", "Olga", "Carlos", "Priya", "Kwame", "Elena", "Taha",
+               "Noah", "Aisha", "Lucas", "Sofia", "Omar", "Hannah", "Ravi", "Mei", "Ivan", "Zara", "Diego", "Amara"]
+LAST_NAMES = ["Smith", "Khan", "Chen", "Garcia", "Ivanova", "Okafor", "Tanaka", "Müller", "Rossi", "Patel", "Nguyen",
+              "Haddad", "Silva", "Kowalski", "Hughes", "Larsen", "Mensah", "Dubois", "Kim", "Ali", "Novak", "Reyes"]
+ADJECTIVES = ["Silent", "Hidden", "Last", "Burning", "Forgotten", "Brief", "Endless", "Crimson", "Quantum", "Secret",
+              "Broken", "Golden", "Distant", "Wandering", "Invisible", "Ancient", "Midnight", "Hollow", "Restless"]
+NOUNS = ["River", "Empire", "Garden", "Equation", "Machine", "Ocean", "Kingdom", "History", "Universe", "Mind",
+         "Storm", "Library", "Mountain", "Signal", "Shadow", "Voyage", "Code", "Forest", "Star", "Memory", "City"]
+PLACES = ["the Dark", "Time", "Mars", "the North", "Paris", "the Desert", "Space", "the Valley", "Tokyo", "the Deep"]
+TEMPLATES = ["The {adj} {noun}", "{noun} of {place}", "A {adj} History of {noun}s", "The {noun} and the {noun2}",
+             "{adj} {noun}s", "Beyond the {adj} {noun}", "The {noun} Problem", "Letters from {place}"]
+# Roughly the shape of a public-library collection: a long tail of genres behind a few dominant ones.
+GENRES = {"Fiction": 22, "Mystery": 12, "Science Fiction": 10, "Fantasy": 10, "History": 9, "Biography": 8,
+          "Romance": 8, "Physics": 5, "Philosophy": 4, "Poetry": 3, "Travel": 3, "Cooking": 3, "Art": 2, "Economics": 1}
+
+def person_name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+def generate_books(count: int, seed: int = 42):
+    """Yields `count` unique (title, author, genre, copies) rows; a few prolific authors write most books."""
+    rng = random.Random(seed)
+    authors = [person_name(rng) + (f" {chr(65 + i % 26)}." if i >= 100 else "") for i in range(max(10, count // 20))]
+    genres, weights = list(GENRES), list(GENRES.values())
+    seen = set()
+    while len(seen) < count:
+        title = rng.choice(TEMPLATES).format(adj=rng.choice(ADJECTIVES), noun=rng.choice(NOUNS),
+                                             noun2=rng.choice(NOUNS), place=rng.choice(PLACES))
+        if title in seen: title = f"{title}, Volume {len(seen)}"
+        seen.add(title)
+        author = authors[min(int(rng.paretovariate(1.2)) - 1, len(authors) - 1)]  # Zipf-like author popularity.
+        yield title, author, rng.choices(genres, weights)[0], rng.choice([0, 1, 1, 2, 2, 3, 4, 5, 8])
+
+def generate_catalog(db_path: str, members: int = 1000, books: int = 10000, seed: int = 42) -> dict:
+    """Builds a fresh database with `setup_database` and adds `members` members and `books` synthetic books."""
+    with contextlib.redirect_stdout(io.StringIO()): setup_database(db_path)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO members (name, email) VALUES (?, ?)",
+                     ((person_name(rng), f"member{i}@example.com") for i in range(members)))
+    conn.commit(); conn.close()
+    load_books(generate_books(books, seed), db_path=db_path)
+    return {"members": members + 2, "books": books + 6, "seed": seed}  # Plus setup_database's sample rows.
@@ -0,0 +1,64 @@
+# benchmarks/cold_start.py
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Everything app.py imports from this repository, in the same order.
+APP_MODULES = ["assistant.chat", "assistant.history", "assistant.connection", "assistant.http_client", "assistant.importer", "assistant.model",
+               "assistant.service", "assistant.speech", "assistant.thumbnails", "assistant.tools", "assistant.tracing", "assistant.warmup"]
+# Dependencies that must only load on first use, never while the app starts.
+LAZY_MODULES = ["google.generativeai", "numpy", "gtts", "openai", "PIL", "requests"]
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+for name in sys.argv[2:]: __import__(name)
+elapsed_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({"import_ms": elapsed_ms, "loaded": [name for name in json.loads(sys.argv[1]) if name in sys.modules]}))
+"""
+
+def probe(modules: list) -> dict:
+    """Imports `modules` in a fresh interpreter and returns the import time, process time and lazy modules loaded."""
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", _PROBE, json.dumps(LAZY_MODULES), *modules], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+def measure(runs: int) -> dict:
+    samples = [probe(APP_MODULES) for _ in range(runs)]
+    pick = lambda key: round(sorted(sample[key] for sample in samples)[len(samples) // 2], 1)
+    return {"runs": runs, "import_ms": pick("import_ms"), "process_ms": pick("process_ms"),
+            "eagerly_loaded": sorted({name for sample in samples for name in sample["loaded"]})}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how long the app's own modules take to import in a fresh process.")
+    parser.add_argument("--runs", type=int, default=7, help="Fresh interpreters to start; the median is reported")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="Fail if the median import time exceeds this")
+    parser.add_argument("--out", help="Write the JSON report here")
+    parser.add_argument("--compare", help="A previous JSON report; fail if import time regressed beyond --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before --compare fails (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    report = measure(args.runs)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f: json.dump(report, f, indent=2)
+    failures = []
+    if report["eagerly_loaded"]: failures.append("loaded at import time: " + ", ".join(report["eagerly_loaded"]))
+    if report["import_ms"] > args.budget_ms: failures.append(f"import took {report['import_ms']} ms (budget {args.budget_ms} ms)")
+    if args.compare:
+        with open(args.compare) as f: baseline = json.load(f)
+        change = (report["import_ms"] - baseline["import_ms"]) / baseline["import_ms"] if baseline["import_ms"] else 0.0
+        print(f"import_ms: {baseline['import_ms']} -> {report['import_ms']} ({change:+.1%})")
+        if change > args.tolerance: failures.append(f"import time regressed {change:+.1%}")
+    if failures: sys.exit("Cold start regressed: " + "; ".join(failures))
+
+if __name__ == "__main__":
+    main()
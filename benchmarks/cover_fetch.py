@@ -0,0 +1,97 @@
+# benchmarks/cover_fetch.py
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from assistant import connection, tools
+from .catalog import generate_catalog
+
+class SlowUpstream(ThreadingHTTPServer):
+    """A local stand-in for Google Books that answers every lookup after `delay` seconds, or `slow_delay` for slow titles."""
+    daemon_threads = True
+
+    def __init__(self, delay: float, slow_delay: float):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.delay, self.slow_delay, self.requests = delay, slow_delay, 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/books/v1/volumes"
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args): pass
+
+    def do_GET(self):
+        server, query = self.server, parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        with server._lock: server.requests += 1
+        time.sleep(server.slow_delay if "slow" in query else server.delay)
+        body = json.dumps({"items": [{"volumeInfo": {"imageLinks": {"thumbnail": "http://covers.invalid/cover.jpg"}}}]}).encode()
+        try:
+            self.send_response(200); self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body))); self.end_headers(); self.wfile.write(body)
+        except OSError: pass  # The client gave up on a slow answer.
+
+def _lookup(titles: list) -> tuple:
+    started = time.perf_counter()
+    covers = tools.fetch_cover_urls([(title, "Stub Author") for title in titles])
+    return time.perf_counter() - started, covers
+
+def run_checks(db_path: str, lookups: int, delay: float, slow: int) -> dict:
+    """Checks that a page of cover lookups runs in parallel and that a search never waits past COVER_FETCH_DEADLINE."""
+    connection.DB_PATH = db_path
+    server = SlowUpstream(delay, slow_delay=tools.COVER_FETCH_DEADLINE + 1.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tools.GOOGLE_BOOKS_API_URL = server.url
+    tools._google_books.retries = 0  # Each slow lookup then fails once at the read timeout instead of being retried.
+    report, problems = {}, []
+
+    # Parallel: a page of lookups costs about one upstream delay, not one per book.
+    seconds, covers = _lookup([f"parallel title {i}" for i in range(lookups)])
+    found = sum(1 for url in covers.values() if url)
+    report["parallel"] = {"lookups": lookups, "upstream_delay": delay, "seconds": round(seconds, 3), "found": found}
+    serial = delay * min(lookups, tools.COVER_FETCH_CONCURRENCY)
+    if found != lookups: problems.append(f"parallel: found {found}/{lookups} covers")
+    if seconds > serial * 0.6: problems.append(f"parallel: {lookups} lookups took {seconds:.2f}s (serial would take {serial:.2f}s)")
+
+    # Deadline: slow lookups come back empty once the deadline passes, without holding up the fast ones.
+    titles = [f"slow title {i}" for i in range(slow)] + [f"fast title {i}" for i in range(lookups - slow)]
+    seconds, covers = _lookup(titles)
+    late = [url for (title, _), url in covers.items() if title.startswith("slow")]
+    on_time = [url for (title, _), url in covers.items() if title.startswith("fast")]
+    report["deadline"] = {"deadline": tools.COVER_FETCH_DEADLINE, "seconds": round(seconds, 3), "slow": slow,
+                          "late_empty": sum(1 for url in late if not url), "on_time_found": sum(1 for url in on_time if url)}
+    if seconds > tools.COVER_FETCH_DEADLINE + 0.5: problems.append(f"deadline: search waited {seconds:.2f}s (deadline {tools.COVER_FETCH_DEADLINE}s)")
+    if any(late): problems.append(f"deadline: {sum(1 for url in late if url)} late covers were not empty")
+    if not all(on_time): problems.append(f"deadline: only {sum(1 for url in on_time if url)}/{len(on_time)} fast covers arrived")
+    if tools.cover_cache.get("slow title 0", "Stub Author") is not None: problems.append("deadline: a late lookup was cached as 'no cover'")
+
+    time.sleep(tools._google_books.timeout[1] - seconds + 0.5)  # Let the late lookups time out before the stand-in goes away.
+    report["upstream_requests"], report["problems"] = server.requests, problems
+    server.shutdown()
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check parallel cover lookups and the search deadline against a local slow Google Books stand-in.")
+    parser.add_argument("--lookups", type=int, default=8, help="Covers looked up at once, like one search page")
+    parser.add_argument("--delay", type=float, default=0.5, help="Seconds the stand-in takes per lookup")
+    parser.add_argument("--slow", type=int, default=3, help="Lookups in the deadline check that answer after the deadline")
+    parser.add_argument("--out", help="Also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="library-covers-"), "library.db")
+    generate_catalog(db_path, members=10, books=100)
+    report = run_checks(db_path, args.lookups, args.delay, args.slow)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f: json.dump(report, f, indent=2)
+    if report["problems"]: sys.exit("Cover lookups misbehaved: " + "; ".join(report["problems"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/http_faults.py
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from assistant import connection, tools
+from .catalog import generate_catalog
+
+class FaultyUpstream(ThreadingHTTPServer):
+    """A local stand-in for Google Books whose `mode` decides how it answers:
+
+    ok: a volume with a thumbnail; flaky: the first request for each URL fails with 503; error: always 503;
+    slow: answers after `delay` seconds; reset: drops the connection without answering.
+    """
+    daemon_threads = True
+
+    def __init__(self, mode: str = "ok", delay: float = 3.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.mode, self.delay, self.requests, self.seen = mode, delay, 0, set()
+        self._lock = threading.Lock()
+
+    def next_request(self, path: str) -> tuple:
+        """Counts a request and returns (its number, whether this path was requested before)."""
+        with self._lock:
+            self.requests += 1
+            repeated = path in self.seen; self.seen.add(path)
+            return self.requests, repeated
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/books/v1/volumes"
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args): pass
+
+    def do_GET(self):
+        server = self.server
+        count, repeated = server.next_request(self.path)
+        if server.mode == "reset":
+            self.connection.close(); return
+        if server.mode == "slow": time.sleep(server.delay)
+        if server.mode == "error" or (server.mode == "flaky" and not repeated):
+            self.send_error(503); return
+        body = json.dumps({"items": [{"volumeInfo": {"imageLinks": {"thumbnail": f"http://covers.invalid/{count}.jpg"}}}]}).encode()
+        self.send_response(200); self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body))); self.end_headers(); self.wfile.write(body)
+
+def _lookup(scenario: str, count: int) -> dict:
+    """Resolves `count` never-seen covers the way a search does and returns how long it took and how many were found."""
+    started = time.perf_counter()
+    covers = tools.fetch_cover_urls([(f"{scenario} title {i}", "Fault Author") for i in range(count)])
+    return {"seconds": round(time.perf_counter() - started, 3), "found": sum(1 for url in covers.values() if url)}
+
+def run_scenarios(db_path: str, delay: float, cooldown: float, lookups: int) -> dict:
+    """Drives cover lookups through healthy, flaky, stalled, failing and recovering upstreams and checks each outcome."""
+    connection.DB_PATH = db_path
+    title = connection.get_connection().execute("SELECT title FROM books ORDER BY id DESC LIMIT 1").fetchone()[0]
+    server = FaultyUpstream(delay=delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tools.GOOGLE_BOOKS_API_URL = server.url
+    client = tools._google_books
+    client.breaker.cooldown = cooldown
+    report, problems = {}, []
+
+    def scenario(name: str, mode: str, expect):
+        server.mode, before = mode, server.requests
+        result = _lookup(name, lookups)
+        time.sleep(0.1)  # Let lookups that outlived the search deadline finish before reading the counters.
+        result.update(upstream_requests=server.requests - before, breaker=client.stats())
+        report[name] = result
+        problems.extend(f"{name}: {problem}" for problem in expect(result))
+
+    deadline = tools.COVER_FETCH_DEADLINE + 0.5
+    scenario("healthy", "ok", lambda r: [f"found {r['found']}/{lookups} covers"] * (r["found"] != lookups))
+    scenario("flaky", "flaky", lambda r: [f"found {r['found']}/{lookups} covers despite retries"] * (r["found"] != lookups)
+             + ["breaker opened on a flaky upstream"] * (r["breaker"]["state"] != "closed"))
+    scenario("stalled", "slow", lambda r: [f"search waited {r['seconds']}s (deadline {tools.COVER_FETCH_DEADLINE}s)"] * (r["seconds"] > deadline))
+    give_up = time.monotonic() + client.timeout[1] * (client.retries + 1) + 2
+    while client.breaker.state != "open" and time.monotonic() < give_up: time.sleep(0.05)  # Stalled lookups time out in the background.
+    report["stalled"]["breaker"] = client.stats()
+    if client.breaker.state != "open": problems.append(f"stalled: breaker is {client.breaker.state} after repeated timeouts")
+    scenario("open", "error", lambda r: [f"{r['upstream_requests']} requests reached a host behind an open breaker"] * (r["upstream_requests"] > 0)
+             + [f"search took {r['seconds']}s with the breaker open"] * (r["seconds"] > 0.2))
+    server.mode, started = "error", time.perf_counter()
+    results = tools.search_books(title)
+    report["open"]["search_seconds"] = round(time.perf_counter() - started, 3)
+    if not isinstance(results, list) or any(book["cover_url"] for book in results):
+        problems.append(f"open: search did not return text-only results ({results!r})")
+    time.sleep(cooldown)
+    scenario("trial_fails", "reset", lambda r: ["breaker closed after a failed trial"] * (r["breaker"]["state"] != "open")
+             + [f"{r['upstream_requests']} requests in the trial (expected 1 call)"] * (r["upstream_requests"] > client.retries + 1))
+    time.sleep(cooldown)
+    scenario("recovered", "ok", lambda r: ["breaker still open after a successful trial"] * (r["breaker"]["state"] != "closed"))
+    report["problems"] = problems
+    server.shutdown()
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check cover lookups against a local Google Books stand-in that stalls, fails and recovers.")
+    parser.add_argument("--lookups", type=int, default=8, help="Covers each scenario looks up at once, like one search page")
+    parser.add_argument("--delay", type=float, default=3.0, help="How long the stalled upstream takes to answer")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="Breaker cooldown for this run (HTTP_BREAKER_COOLDOWN in production)")
+    parser.add_argument("--out", help="Also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="library-http-"), "library.db")
+    generate_catalog(db_path, members=10, books=100)
+    report = run_scenarios(db_path, args.delay, args.cooldown, args.lookups)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f: json.dump(report, f, indent=2)
+    if report["problems"]: sys.exit("Outbound HTTP misbehaved: " + "; ".join(report["problems"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# benchmarks/load_driver.py
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from assistant import connection, service, tools
+from assistant.backends import FixtureStore, MODEL_FIXTURES, StandInModel
+from assistant.chat import response_cache, run_turn
+from assistant.history import compact_chat
+from assistant.response_cache import ADMIN_ID
+from .catalog import generate_catalog, person_name
+from .run import summarize, _stub_covers
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+MOODS = ["something cozy and heartwarming", "a dark thriller", "I'm feeling adventurous", "something funny", "a sad story", "recommend a mystery"]
+
+def _prompts(rng: random.Random, titles: list, turns: int) -> list:
+    """A session's prompts: mostly searches and mood requests, with account questions, a reservation and its cancellation."""
+    prompts = []
+    for _ in range(turns):
+        title = rng.choice(titles)
+        prompts.append(rng.choices([f"Do you have {title}?", rng.choice(title.split()), rng.choice(MOODS), "Show my details",
+                                    f"reserve {title}", "Who made you?"], weights=[30, 20, 25, 10, 10, 5])[0])
+    if any(prompt.startswith("reserve ") for prompt in prompts):
+        reserved = next(prompt for prompt in reversed(prompts) if prompt.startswith("reserve "))
+        prompts.append("cancel " + reserved[len("reserve "):])
+    return prompts
+
+def _session(model, member: tuple, prompts: list, stream: bool, results: dict, lock):
+    """Logs one member in and runs their prompts through the real turn loop, tools and cache."""
+    try:
+        member_info = service.call("check_member_credentials", *member)
+        if not member_info: raise ValueError(f"login failed for member {member[0]}")
+    except Exception as e:
+        with lock: results["errors"].append(f"login: {e}")
+        return
+    chat = model.start_chat()
+    for prompt in prompts:
+        stats, chunks = {}, []
+        started = time.perf_counter()
+        try:
+            text = run_turn(chat, prompt, member_info["id"], on_text=chunks.append if stream else None, stats=stats)
+            chat, _ = compact_chat(chat)
+        except Exception as e:
+            with lock: results["errors"].append(f"{prompt!r}: {e}")
+            continue
+        elapsed = time.perf_counter() - started
+        with lock:
+            results["latency"].append(elapsed); results["ttft"].append(stats["ttft_ms"] / 1000)
+            results["tool_rounds"] += stats["tool_rounds"]
+            if "Error:" in text: results["tool_errors"] += 1
+
+def _members(conn, count: int, rng: random.Random) -> list:
+    """Returns `count` distinct non-admin (id, name) members, adding synthetic ones if the database has too few."""
+    query = "SELECT id, name FROM members WHERE id != ? ORDER BY id LIMIT ?"
+    members = conn.execute(query, (ADMIN_ID, count)).fetchall()
+    if len(members) < count:  # Sessions sharing a member would cancel and replay each other's reservations.
+        conn.executemany("INSERT INTO members (name, email) VALUES (?, ?)",
+                         ((person_name(rng), f"load-member{i}@example.com") for i in range(count - len(members))))
+        conn.commit()
+        members = conn.execute(query, (ADMIN_ID, count)).fetchall()
+    return members
+
+def run_load(db_path: str, sessions: int, turns: int, model, stream: bool, seed: int) -> dict:
+    """Runs `sessions` concurrent logged-in sessions of `turns` prompts each against `db_path`, one member per session,
+    and returns the report."""
+    rng = random.Random(seed)
+    connection.DB_PATH = db_path
+    tools.fetch_cover_urls = _stub_covers  # Measure the assistant, not Google Books.
+    conn = sqlite3.connect(db_path)
+    members = _members(conn, sessions, rng)
+    titles = [row[0] for row in conn.execute("SELECT title FROM books ORDER BY RANDOM() LIMIT 500")]
+    conn.close()
+    service.call("suggest_books_by_mood", "warm up", 1)  # Build or map the recommendation index outside the timed run.
+    response_cache.clear()
+
+    lock = threading.Lock()
+    results = {"latency": [], "ttft": [], "errors": [], "tool_rounds": 0, "tool_errors": 0}
+    workers = [threading.Thread(target=_session, args=(model, members[i], _prompts(random.Random(rng.random()), titles, turns),
+                                                       stream, results, lock), name=f"session-{i}") for i in range(sessions)]
+    started = time.perf_counter()
+    for worker in workers: worker.start()
+    for worker in workers: worker.join()
+    elapsed = time.perf_counter() - started
+
+    report = {"sessions": sessions, "turns": len(results["latency"]), "seconds": round(elapsed, 2),
+              "turns_per_sec": round(len(results["latency"]) / elapsed, 1), "tool_rounds": results["tool_rounds"],
+              "tool_errors": results["tool_errors"], "errors": len(results["errors"]), "model": dict(model.counters),
+              "response_cache": response_cache.stats(), "service": service.stats()}
+    if results["latency"]:
+        report["latency"], report["ttft"] = summarize(results["latency"]), summarize(results["ttft"])
+    if results["errors"]: report["first_errors"] = results["errors"][:5]
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent logged-in chat sessions against a stand-in model and the real tools.")
+    parser.add_argument("--sessions", type=int, default=50, help="Concurrent sessions")
+    parser.add_argument("--turns", type=int, default=10, help="Prompts per session (plus a cancellation if it reserved something)")
+    parser.add_argument("--backend", choices=["scripted", "replay"], default="scripted", help="replay serves --fixtures and scripts the rest")
+    parser.add_argument("--fixtures", default=MODEL_FIXTURES, help="Recorded exchanges (MODEL_BACKEND=record writes them)")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="Simulated model time to first chunk per round trip")
+    parser.add_argument("--jitter-ms", type=float, default=200.0)
+    parser.add_argument("--stream", action="store_true", help="Stream replies, like the app does")
+    parser.add_argument("--db", help="Run against a copy of this database (default: library.db)")
+    parser.add_argument("--books", type=int, help="Generate a synthetic catalog of this many books instead")
+    parser.add_argument("--members", type=int, default=1000, help="Members in the generated catalog (topped up to --sessions)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="Also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="library-load-"), "library.db")  # Sessions reserve and cancel, so never touch the original.
+    if args.books: generate_catalog(db_path, members=args.members, books=args.books, seed=args.seed)
+    else: shutil.copyfile(args.db or os.path.join(ROOT, "library.db"), db_path)
+    model = StandInModel(FixtureStore(args.fixtures) if args.backend == "replay" else None, latency_ms=args.latency_ms,
+                         jitter_ms=args.jitter_ms, seed=args.seed)
+    report = run_load(db_path, args.sessions, args.turns, model, args.stream, args.seed)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f: json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
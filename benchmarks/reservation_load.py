@@ -0,0 +1,95 @@
+# benchmarks/reservation_load.py
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from assistant import connection, reservations
+from .catalog import generate_catalog
+from .run import summarize
+
+def _timed(samples: list, lock, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    with lock: samples.append(time.perf_counter() - started)
+    return result
+
+def check_invariants(db_path: str, book_id: int, copies: int, members: int) -> list:
+    """Returns every way the reservations for `book_id` disagree with `copies` initial copies and `members` requests."""
+    conn = sqlite3.connect(db_path)
+    count = lambda status: conn.execute("SELECT COUNT(*) FROM reservations WHERE book_id = ? AND status = ?", (book_id, status)).fetchone()[0]
+    held, waiting = count("held"), count("waiting")
+    left = conn.execute("SELECT copies FROM books WHERE id = ?", (book_id,)).fetchone()[0]
+    per_member = conn.execute("SELECT MAX(n) FROM (SELECT COUNT(*) AS n FROM reservations WHERE book_id = ? "
+                              "AND status IN ('held', 'waiting') GROUP BY member_id)", (book_id,)).fetchone()[0]
+    conn.close()
+    problems = []
+    if left < 0: problems.append(f"copies went negative ({left})")
+    if held + left != copies: problems.append(f"{held} held + {left} on the shelf != {copies} copies")
+    if held + waiting != members: problems.append(f"{held} held + {waiting} waiting != {members} members")
+    if (per_member or 0) > 1: problems.append(f"a member holds {per_member} open reservations")
+    return problems
+
+def run_load(db_path: str, members: int, copies: int, threads: int, double_clicks: float, seed: int) -> dict:
+    """Has `members` members reserve one title with `copies` copies from `threads` threads, then cancels every hold."""
+    rng = random.Random(seed)
+    connection.DB_PATH = db_path
+    conn = sqlite3.connect(db_path)
+    book_id, title = conn.execute("SELECT id, title FROM books ORDER BY id LIMIT 1").fetchone()
+    member_ids = [row[0] for row in conn.execute("SELECT id FROM members WHERE id > 0 ORDER BY id LIMIT ?", (members,))]
+    with conn: conn.execute("UPDATE books SET copies = ? WHERE id = ?", (copies, book_id))
+    conn.close()
+    # Every request is sent once; a share of them is sent twice with the same key, like a double-clicked button.
+    requests = [(member_id, title, f"load-{member_id}") for member_id in member_ids]
+    requests += [request for request in requests if rng.random() < double_clicks]
+    rng.shuffle(requests)
+
+    lock, samples, report = threading.Lock(), [], {"title": title, "copies": copies, "members": len(member_ids), "requests": len(requests)}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        outcomes = list(pool.map(lambda request: _timed(samples, lock, reservations.reserve, *request), requests))
+    elapsed = time.perf_counter() - started
+    report["reserve"] = {**summarize(samples), "reservations_per_sec": round(len(requests) / elapsed, 1),
+                         "held": sum(1 for o in outcomes if o["status"] == "held" and not o["replayed"]),
+                         "waiting": sum(1 for o in outcomes if o["status"] == "waiting" and not o["replayed"]),
+                         "replayed": sum(1 for o in outcomes if o["replayed"])}
+    report["problems"] = check_invariants(db_path, book_id, copies, len(member_ids))
+
+    holders = [member_id for outcome, (member_id, *_) in zip(outcomes, requests) if outcome["status"] == "held" and not outcome["replayed"]]
+    samples = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        cancelled = list(pool.map(lambda member_id: _timed(samples, lock, reservations.cancel, member_id, title), holders))
+    elapsed = time.perf_counter() - started
+    if holders:
+        report["cancel"] = {**summarize(samples), "cancellations_per_sec": round(len(holders) / elapsed, 1),
+                            "promoted": sum(1 for c in cancelled if c and c["promoted"] is not None)}
+    report["problems"] += check_invariants(db_path, book_id, copies, len(member_ids) - len(holders))
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hammer one title with concurrent reservations and check nothing is oversold.")
+    parser.add_argument("--members", type=int, default=2000, help="Members reserving the same title")
+    parser.add_argument("--copies", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--double-clicks", type=float, default=0.2, help="Share of requests sent twice with the same key")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="Also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="library-reservations-"), "library.db")
+    generate_catalog(db_path, members=args.members, books=1000, seed=args.seed)
+    report = run_load(db_path, args.members, args.copies, args.threads, args.double_clicks, args.seed)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f: json.dump(report, f, indent=2)
+    if report["problems"]: sys.exit("Invariant violations: " + "; ".join(report["problems"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# benchmarks/run.py
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from assistant import connection, database, tools
+from .catalog import generate_catalog, NOUNS, ADJECTIVES, GENRES, LAST_NAMES
+
+def summarize(samples: list) -> dict:
+    """Reduces per-call latencies (seconds) to percentiles in milliseconds and calls per second."""
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+    return {"calls": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3), "ops_per_sec": round(len(ordered) / sum(ordered), 1)}
+
+def measure(func, args_list: list, warmup: int = 5) -> dict:
+    for args in args_list[:warmup]: func(*args)
+    samples = []
+    for args in args_list:
+        started = time.perf_counter(); func(*args); samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+def _stub_covers(pairs, deadline=None):
+    return {pair: "" for pair in pairs}
+
+def run_benchmarks(db_path: str, iterations: int, seed: int) -> dict:
+    """Times the hot paths against `db_path` and returns {case: stats}."""
+    rng = random.Random(seed)
+    connection.DB_PATH = db_path
+    tools.fetch_cover_urls = _stub_covers  # Measure the catalog, not Google Books.
+    conn = sqlite3.connect(db_path)
+    members = conn.execute("SELECT id, name FROM members ORDER BY id").fetchall()
+    conn.close()
+    queries = [rng.choice([rng.choice(NOUNS), f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}", rng.choice(list(GENRES)),
+                           rng.choice(LAST_NAMES), rng.choice(NOUNS)[:4]]) for _ in range(iterations)]
+    run_id = time.time_ns()
+    results = {
+        "search_books": measure(tools.search_books, [(q,) for q in queries]),
+        "check_member_credentials": measure(database.check_member_credentials, [rng.choice(members) for _ in range(iterations)]),
+        "get_my_details": measure(tools.get_my_details, [(rng.choice(members)[0],) for _ in range(iterations)]),
+        "signup_member": measure(database.signup_member, [(f"Bench {i}", f"bench-{run_id}-{i}@example.com") for i in range(iterations)], warmup=0),
+        "add_book": measure(tools.add_book, [(f"Bench Title {run_id} {i}", "Bench Author", "Fiction", 1) for i in range(iterations)], warmup=0),
+    }
+    try:
+        from assistant.gemini_tools import available_tools
+    except ImportError as e:
+        print(f"Skipping tool_dispatch: {e}", file=sys.stderr)
+    else:
+        calls = [rng.choice([("search_books", {"query": q}), ("get_my_details", {"member_id": rng.choice(members)[0]})]) for q in queries]
+        results["tool_dispatch"] = measure(lambda name, args: available_tools[name](**args), calls)
+    return results
+
+def run_large_search(db_path: str, iterations: int, seed: int) -> dict:
+    """Times searches for the broadest terms (genres, common surnames and words, typos) on a large catalog."""
+    rng = random.Random(seed)
+    connection.DB_PATH = db_path
+    tools.fetch_cover_urls = _stub_covers
+    broad = [*GENRES, *LAST_NAMES, *NOUNS, *ADJECTIVES, "the", "a history of", "fiction", "histroy", "mountian", "quant"]
+    return measure(tools.search_books, [(rng.choice(broad),) for _ in range(iterations)])
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Returns a description of every case whose p50 or p95 got slower than `baseline` by more than `tolerance`."""
+    regressions = []
+    for case, stats in current["results"].items():
+        before = baseline.get("results", {}).get(case)
+        if not before: continue
+        for metric in ("p50_ms", "p95_ms"):
+            change = (stats[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            print(f"  {case:<26} {metric}: {before[metric]:>9.3f} -> {stats[metric]:>9.3f} ms ({change:+.1%})")
+            if change > tolerance: regressions.append(f"{case} {metric} {change:+.1%}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the library assistant's hot paths on a synthetic catalog.")
+    parser.add_argument("--books", type=int, default=50000)
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="Reuse this database instead of generating a temporary one")
+    parser.add_argument("--large-books", type=int, default=200000, help="Also time broad searches on a catalog this big (0 to skip)")
+    parser.add_argument("--search-target-ms", type=float, default=15.0, help="Fail if search_books_large p95 exceeds this")
+    parser.add_argument("--out", default="bench_results.json", help="Where to write the JSON report")
+    parser.add_argument("--compare", help="A previous JSON report; exit non-zero if anything regressed")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before --compare fails (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="library-bench-")
+    db_path = args.db or os.path.join(workdir, "library.db")
+    meta = {"seed": args.seed, "iterations": args.iterations, "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version, "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    if not args.db:
+        started = time.perf_counter()
+        meta.update(generate_catalog(db_path, args.members, args.books, args.seed))
+        meta["generate_seconds"] = round(time.perf_counter() - started, 2)
+    report = {"meta": meta, "results": run_benchmarks(db_path, args.iterations, args.seed)}
+    if args.large_books:
+        large_path = os.path.join(workdir, "large.db")
+        generate_catalog(large_path, args.members, args.large_books, args.seed)
+        report["meta"]["large_books"] = args.large_books
+        report["results"]["search_books_large"] = run_large_search(large_path, args.iterations, args.seed)
+    with open(args.out, "w") as f: json.dump(report, f, indent=2)
+
+    print(f"{'case':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10}")
+    for case, stats in report["results"].items():
+        print(f"{case:<26} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f} {stats['ops_per_sec']:>10.1f}")
+    print(f"Report written to {args.out}")
+    failures = []
+    large = report["results"].get("search_books_large")
+    if large and large["p95_ms"] > args.search_target_ms:
+        failures.append(f"search_books_large p95 {large['p95_ms']} ms > {args.search_target_ms} ms")
+    if args.compare:
+        with open(args.compare) as f: baseline = json.load(f)
+        failures += compare(report, baseline, args.tolerance)
+    if failures: sys.exit("Regressions: " + ", ".join(failures))
+
+if __name__ == "__main__":
+    main()
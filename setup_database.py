@@ -2,16 +2,22 @@
 
 import sqlite3
 import os
+import sys
+from assistant.schema import migrate
+from assistant.vector_index import index_paths
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'library.db')
 
-def setup_database():
+def setup_database(db_path: str = DB_PATH):
     """Creates the database tables and populates them with initial data."""
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
+    if os.path.exists(db_path):
+        os.remove(db_path)
         print("Removed existing database for a clean setup.")
+    # Stale WAL files would be replayed into the new database, and a stale vector index would point at the wrong books.
+    for leftover in (db_path + "-wal", db_path + "-shm", *index_paths(db_path)):
+        if os.path.exists(leftover): os.remove(leftover)
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
     # Create members table
@@ -51,12 +57,25 @@ def setup_database():
     ]
     cursor.executemany("INSERT INTO books (title, author, genre, copies) VALUES (?, ?, ?, ?)", books_to_add)
     print("Populated 'books' table.")
-    
+
     conn.commit()
+
+    # Full-text search index, cover cache and the rest of the versioned schema
+    migrate(conn)
+    print("Created and populated the 'books_fts' search index and the 'cover_cache' table.")
+    
     conn.close()
     print("Database setup complete.")
 
+def migrate_database():
+    """Upgrades an existing database in place (e.g. adds the search index) without touching its data."""
+    conn = sqlite3.connect(DB_PATH)
+    print(f"Database schema is at version {migrate(conn)}.")
+    conn.close()
+
 if __name__ == '__main__':
+    if "--migrate" in sys.argv:
+        migrate_database(); sys.exit()
     setup_database()
     print("\n--- LOGIN CREDENTIALS ---")
     print("Admin Login -> Name: Admin, ID: 0")